@@ -2,38 +2,162 @@
 
 from pygame.locals import *
 
+import os
+import sys
 import pygame
 
+HEADLESS = "--headless" in sys.argv
+TRACE = "--trace" in sys.argv
+RECORD = "--record" in sys.argv
+PROFILE = "--profile" in sys.argv
+SAMPLE = "--sample" in sys.argv
+
+# headless runs need neither a display nor a sound card
+if HEADLESS:
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+
 # initialise pygame before we import anything else
 pygame.mixer.pre_init(44100, -16, 2, 1024)
 pygame.init()
 
 import rpg.states
 
-FRAMES_PER_SEC = 60
+from rpg.eventtrace import EventTracer
+from rpg.gameloop import GameLoop, ScriptedInput, FixedTimestep, runTicks, runHeadless, getRandomScript
+from rpg.replay import loadReplay, REPLAY_FILE
+from rpg.cpuprofile import StateProfiler, StackSampler
+
+HEADLESS_FRAMES = 10000
+
+# frames played when profiling, unless playing a replay
+PROFILE_FRAMES = 1800
+
+"""
+Returns a game loop with the tracer + profilers requested on the command line:
+
+--trace     record events + frame times - see eventtrace.py
+--profile   cProfile each state + sample stacks - see cpuprofile.py
+--sample    just sample stacks, which is cheap enough to leave running
+"""
+def createGameLoop():
+    gameLoop = GameLoop(EventTracer() if TRACE else None)
+    if PROFILE:
+        gameLoop.stateProfiler = StateProfiler()
+    if PROFILE or SAMPLE:
+        gameLoop.sampler = StackSampler()
+        gameLoop.sampler.start()
+    return gameLoop
+
+"""
+Returns the recording to play with --replay - the path that follows it, if
+any, eg. one of the play-throughs in replays/, otherwise the one made with
+--record.
+"""
+def getReplayPath():
+    index = sys.argv.index("--replay") + 1
+    if index < len(sys.argv) and not sys.argv[index].startswith("--"):
+        return sys.argv[index]
+    return REPLAY_FILE
+
+def getFrameCount(defaultCount):
+    if "--frames" in sys.argv:
+        return int(sys.argv[sys.argv.index("--frames") + 1])
+    return defaultCount
+
+"""
+Handles the window + hot key events.  Returns False if the game is quit.
+"""
+def handleEvents():
+    for event in pygame.event.get():
+        if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
+            return False
+        if event.type == KEYDOWN and event.key == K_x:
+            # mute sound handler + music
+            rpg.states.soundHandler.toggleSound()
+            rpg.states.musicPlayer.toggleMusic()
+        if event.type == KEYDOWN and event.key == K_p:
+            # show/hide the frame profiler
+            rpg.states.toggleProfiler()
+        if event.type == VIDEOEXPOSE:
+            # the screen still holds the last frame drawn
+            pygame.display.flip()
+    return True
+
+"""
+Runs the game in real time with a FixedTimestep, until the given number of
+frames have been played, if any.  If waitForInput is set the loop sleeps while
+the current state is only waiting for a key press.  Returns False if the game
+is quit.
+"""
+def runWindowed(gameLoop, getKeyPresses, frameCount = None, waitForInput = False):
+    timestep = FixedTimestep()
+    while not frameCount or gameLoop.frameCount < frameCount:
+        if waitForInput and gameLoop.isWaitingForInput():
+            # sleep until there's an event, then put it back to be handled below
+            pygame.event.post(pygame.event.wait())
+            timestep.reset()
+        ticks = timestep.getTicks()
+        if not handleEvents():
+            return False
+        if frameCount:
+            ticks = min(ticks, frameCount - gameLoop.frameCount)
+        runTicks(gameLoop, ticks, getKeyPresses)
+    return True
 
 def playMain():
+    gameLoop = createGameLoop()
     # get the first state
-    currentState = rpg.states.startGame()
+    gameLoop.start()
+    if RECORD:
+        gameLoop.startRecording()
+    # profiling is limited to a set number of frames
+    frameCount = getFrameCount(PROFILE_FRAMES) if PROFILE else None
     # start the main loop
-    clock = pygame.time.Clock()    
-    while True:
-        clock.tick(FRAMES_PER_SEC)
-        for event in pygame.event.get():
-            if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
-                return
-            if event.type == KEYDOWN and event.key == K_x:
-                # mute sound handler
-                rpg.states.soundHandler.toggleSound()
-        # detect key presses    
-        keyPresses = pygame.key.get_pressed()
-        # delegate key presses to the current state
-        newState = currentState.execute(keyPresses)
-        # flush sounds
-        rpg.states.soundHandler.flush()
-        # change state if necessary
-        if newState:
-            currentState = newState
+    runWindowed(gameLoop, pygame.key.get_pressed, frameCount, True)
+    gameLoop.close()
+
+"""
+Plays the game from a random script as fast as possible, with no display.
+"""
+def headlessMain():
+    frameCount = getFrameCount(HEADLESS_FRAMES)
+    gameLoop = createGameLoop()
+    gameLoop.start()
+    if RECORD:
+        gameLoop.startRecording()
+    framesPerSec = runHeadless(gameLoop, ScriptedInput(getRandomScript(0, frameCount)), frameCount)
+    print("frames: %d (%.0f per second)" % (gameLoop.frameCount, framesPerSec))
+    print("states: %s" % gameLoop.stateCounts)
+    gameLoop.close()
+
+"""
+Plays back a recording - see getReplayPath - either in a window at the normal
+frame rate or, if headless, as fast as possible.  Reports whether the replay
+ended in the same state as the recording.
+"""
+def replayMain():
+    replay = loadReplay(getReplayPath())
+    gameLoop = createGameLoop()
+    gameLoop.start(registry = replay.registry)
+    scriptedInput = ScriptedInput(replay.getScript())
+    if HEADLESS:
+        framesPerSec = runHeadless(gameLoop, scriptedInput, replay.frameCount)
+        print("frames: %d (%.0f per second)" % (gameLoop.frameCount, framesPerSec))
+    elif not runWindowed(gameLoop, scriptedInput.getKeyPresses, replay.frameCount):
+        gameLoop.close()
+        return
+    if replay.verify(rpg.states.player, rpg.states.registryHandler.registry):
+        print("replay matches recording")
+    else:
+        print("replay does not match recording")
+    gameLoop.close()
 
 # this calls the testMain function when this script is executed
-if __name__ == '__main__': playMain()
+if __name__ == '__main__':
+    if "--replay" in sys.argv:
+        replayMain()
+    elif HEADLESS:
+        headlessMain()
+    else:
+        playMain()
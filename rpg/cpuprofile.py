@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import cProfile
+import threading
+
+"""
+CPU profiling split by game state.  Both profilers are attached to the game
+loop, which tells them which state is running each frame.
+
+StateProfiler runs cProfile with a separate profile for each type of state,
+and writes each one out as a pstats file.  This is accurate but slows the game
+down, so it is meant for a bounded number of frames or a replay.
+
+StackSampler is a low overhead alternative that can be left running during
+normal play.  A background thread samples the game thread's stack every
+SAMPLE_INTERVAL seconds and counts each distinct stack, rooted at the name of
+the state that was running.  Samples taken between frames, eg. while waiting
+for the next tick, are rooted at IDLE.  The samples from any frame that takes
+longer than the frame budget are also counted separately, so the cause of
+spikes can be seen on its own.  The counts are written out in the collapsed
+stack format used by flamegraph.pl and speedscope.
+"""
+
+PROFILE_FOLDER = "profile"
+
+SAMPLE_INTERVAL = 0.005
+FRAME_BUDGET = 1.0 / 60
+
+IDLE = "idle"
+
+class StateProfiler:
+
+    def __init__(self):
+        # cProfile.Profile keyed on state name
+        self.profiles = {}
+        self.profile = None
+
+    def enable(self, stateName):
+        profile = self.profiles.get(stateName)
+        if not profile:
+            profile = self.profiles[stateName] = cProfile.Profile()
+        profile.enable()
+        self.profile = profile
+
+    def disable(self):
+        self.profile.disable()
+        self.profile = None
+
+    def dump(self, folder = PROFILE_FOLDER):
+        os.makedirs(folder, exist_ok = True)
+        for stateName, profile in self.profiles.items():
+            path = os.path.join(folder, stateName + ".pstats")
+            profile.dump_stats(path)
+            print("profile written: %s" % path)
+
+"""
+Returns the given stack frame and its callers as a collapsed stack string,
+outermost caller first.
+"""
+def getCollapsedStack(rootName, frame):
+    names = []
+    while frame:
+        code = frame.f_code
+        names.append("%s:%s" % (os.path.basename(code.co_filename), code.co_name))
+        frame = frame.f_back
+    names.append(rootName)
+    names.reverse()
+    return ";".join(names)
+
+class StackSampler:
+
+    def __init__(self, interval = SAMPLE_INTERVAL, frameBudget = FRAME_BUDGET):
+        self.interval = interval
+        self.frameBudget = frameBudget
+        # the thread that is sampled is the one that creates the sampler
+        self.threadId = threading.get_ident()
+        self.lock = threading.Lock()
+        self.stateName = IDLE
+        self.frameStart = None
+        # sample counts keyed on collapsed stack
+        self.stacks = {}
+        self.spikeStacks = {}
+        # the stacks sampled during the current frame
+        self.frameStacks = []
+        self.running = False
+        self.thread = None
+        # instrumentation
+        self.sampleCount = 0
+        self.spikeCount = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target = self.run, name = "StackSampler")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while self.running:
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self.threadId)
+            if not frame:
+                continue
+            with self.lock:
+                stack = getCollapsedStack(self.stateName, frame)
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+                if self.frameStart is not None:
+                    self.frameStacks.append(stack)
+                self.sampleCount += 1
+
+    def beginFrame(self, stateName):
+        with self.lock:
+            self.stateName = stateName
+            self.frameStacks = []
+            self.frameStart = time.perf_counter()
+
+    def endFrame(self):
+        with self.lock:
+            if time.perf_counter() - self.frameStart > self.frameBudget:
+                self.spikeCount += 1
+                for stack in self.frameStacks:
+                    self.spikeStacks[stack] = self.spikeStacks.get(stack, 0) + 1
+            self.stateName = IDLE
+            self.frameStart = None
+
+    def writeStacks(self, path, stacks):
+        with open(path, "w") as stacksFile:
+            for stack, count in sorted(stacks.items()):
+                stacksFile.write("%s %d\n" % (stack, count))
+        print("stacks written: %s" % path)
+
+    def dump(self, folder = PROFILE_FOLDER):
+        os.makedirs(folder, exist_ok = True)
+        with self.lock:
+            self.writeStacks(os.path.join(folder, "samples.collapsed"), self.stacks)
+            self.writeStacks(os.path.join(folder, "spikes.collapsed"), self.spikeStacks)
+        print("%d samples, %d frames over budget" % (self.sampleCount, self.spikeCount))
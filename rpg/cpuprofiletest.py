@@ -0,0 +1,48 @@
+#! /usr/bin/env python
+
+import time
+import pstats
+import unittest
+
+from .cpuprofile import StateProfiler, StackSampler
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+class StateProfilerTest(unittest.TestCase):
+
+    def testStatesAreProfiledSeparately(self):
+        stateProfiler = StateProfiler()
+        for stateName in ("PlayState", "SceneTransitionState", "PlayState"):
+            stateProfiler.enable(stateName)
+            spin(0.001)
+            stateProfiler.disable()
+        self.assertEqual({"PlayState", "SceneTransitionState"}, set(stateProfiler.profiles))
+        stats = pstats.Stats(stateProfiler.profiles["PlayState"])
+        calls = [stat[0] for function, stat in stats.stats.items() if function[2] == "spin"]
+        self.assertEqual([2], calls)
+
+class StackSamplerTest(unittest.TestCase):
+
+    def testSlowFramesAreCountedAsSpikes(self):
+        sampler = StackSampler(0.001, 0.02)
+        sampler.start()
+        self.addCleanup(sampler.stop)
+        sampler.beginFrame("PlayState")
+        spin(0.001)
+        sampler.endFrame()
+        sampler.beginFrame("GameOverState")
+        spin(0.1)
+        sampler.endFrame()
+        sampler.stop()
+        self.assertEqual(1, sampler.spikeCount)
+        self.assertTrue(sampler.spikeStacks)
+        for stack in sampler.spikeStacks:
+            self.assertTrue(stack.startswith("GameOverState;"))
+        spinCount = sum(count for stack, count in sampler.spikeStacks.items() if stack.endswith("cpuprofiletest.py:spin"))
+        self.assertGreater(spinCount, 10)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,103 +1,98 @@
 #!/usr/bin/env python
 
+from .events import CoinCollectedEvent, KeyCollectedEvent, DoorOpenedEvent, CheckpointReachedEvent
+from .events import DoorOpeningEvent, PlayerFootstepEvent, MapTransitionEvent, LifeLostEvent, EndGameEvent
+from .events import WaspZoomingEvent, BeetleCrawlingEvent, PlayerFallingEvent
+
+"""
+The listener method that is called for each type of event.
+"""
+LISTENER_METHODS = {CoinCollectedEvent: "coinCollected",
+                    KeyCollectedEvent: "keyCollected",
+                    DoorOpenedEvent: "doorOpened",
+                    CheckpointReachedEvent: "checkpointReached",
+                    DoorOpeningEvent: "doorOpening",
+                    PlayerFootstepEvent: "playerFootstep",
+                    MapTransitionEvent: "mapTransition",
+                    LifeLostEvent: "lifeLost",
+                    EndGameEvent: "endGame",
+                    WaspZoomingEvent: "waspZooming",
+                    BeetleCrawlingEvent: "beetleCrawling",
+                    PlayerFallingEvent: "playerFalling"}
+
+"""
+Delivers events to the listeners registered for each event type.
+
+Listeners that affect the game, eg. the registry, need events delivered
+immediately.  Listeners that just react to the game, eg. sound, can instead be
+queued - their events are held until flush is called once per frame, and
+duplicate events raised in the same frame are collapsed into one.
+
+Counts of events raised and delivered are kept for each event type.  An event
+delivered to several listeners is counted once per listener.
+"""
 class EventBus:
-    
-    def __init__(self):
-        self.coinCollectedListeners = []
-        self.keyCollectedListeners = []
-        self.doorOpenedListeners = []
-        self.checkpointReachedListeners = []
-        self.doorOpeningListeners = []
-        self.playerFootstepListeners = []
-        self.mapTransitionListeners = []
-        self.lifeLostListeners = []
-        self.endGameListeners = []
-        self.waspZoomingListeners = []
-        self.waspHoveringListeners = []
-        self.beetleCrawlingListeners = []
-        self.playerFallingListeners = []
-        
-    def addCoinCollectedListener(self, coinCollectedListener):
-        self.coinCollectedListeners.append(coinCollectedListener)
-            
-    def dispatchCoinCollectedEvent(self, coinCollectedEvent):
-        for listener in self.coinCollectedListeners:
-            listener.coinCollected(coinCollectedEvent)
-
-    def addKeyCollectedListener(self, keyCollectedListener):
-        self.keyCollectedListeners.append(keyCollectedListener)
-            
-    def dispatchKeyCollectedEvent(self, keyCollectedEvent):
-        for listener in self.keyCollectedListeners:
-            listener.keyCollected(keyCollectedEvent)
-
-    def addDoorOpenedListener(self, doorOpenedListener):
-        self.doorOpenedListeners.append(doorOpenedListener)
-            
-    def dispatchDoorOpenedEvent(self, doorOpenedEvent):
-        for listener in self.doorOpenedListeners:
-            listener.doorOpened(doorOpenedEvent)
-
-    def addCheckpointReachedListener(self, checkpointReachedListener):
-        self.checkpointReachedListeners.append(checkpointReachedListener)
-            
-    def dispatchCheckpointReachedEvent(self, checkpointReachedEvent):
-        for listener in self.checkpointReachedListeners:
-            listener.checkpointReached(checkpointReachedEvent)
-
-    def addDoorOpeningListener(self, doorOpeningListener):
-        self.doorOpeningListeners.append(doorOpeningListener)
-        
-    def dispatchDoorOpeningEvent(self, doorOpeningEvent):
-        for listener in self.doorOpeningListeners:
-            listener.doorOpening(doorOpeningEvent)
-
-    def addPlayerFootstepListener(self, playerFootstepListener):
-        self.playerFootstepListeners.append(playerFootstepListener)
-
-    def dispatchPlayerFootstepEvent(self, playerFootstepEvent):
-        for listener in self.playerFootstepListeners:
-            listener.playerFootstep(playerFootstepEvent)
-
-    def addMapTransitionListener(self, mapTransitionListener):
-        self.mapTransitionListeners.append(mapTransitionListener)
-        
-    def dispatchMapTransitionEvent(self, mapTransitionEvent):
-        for listener in self.mapTransitionListeners:
-            listener.mapTransition(mapTransitionEvent)
-
-    def addLifeLostListener(self, lifeLostListener):
-        self.lifeLostListeners.append(lifeLostListener)
-        
-    def dispatchLifeLostEvent(self, lifeLostEvent):
-        for listener in self.lifeLostListeners:
-            listener.lifeLost(lifeLostEvent)
 
-    def addEndGameListener(self, endGameListener):
-        self.endGameListeners.append(endGameListener)
+    def __init__(self):
+        # bound listener methods keyed on event type
+        self.listeners = dict((eventType, []) for eventType in LISTENER_METHODS)
+        self.queuedListeners = dict((eventType, []) for eventType in LISTENER_METHODS)
+        # queued events keyed on Event.getKey
+        self.queue = {}
+        # counters
+        self.raisedCounts = dict((eventType, 0) for eventType in LISTENER_METHODS)
+        self.deliveredCounts = dict((eventType, 0) for eventType in LISTENER_METHODS)
+        # optional EventTracer
+        self.tracer = None
         
-    def dispatchEndGameEvent(self, endGameEvent):
-        for listener in self.endGameListeners:
-            listener.endGame(endGameEvent)
-
-    def addWaspZoomingListener(self, waspZoomingListener):
-        self.waspZoomingListeners.append(waspZoomingListener)
-
-    def dispatchWaspZoomingEvent(self, waspZoomingEvent):
-        for listener in self.waspZoomingListeners:
-            listener.waspZooming(waspZoomingEvent)
-
-    def addBeetleCrawlingListener(self, beetleCrawlingListener):
-        self.beetleCrawlingListeners.append(beetleCrawlingListener)
-
-    def dispatchBeetleCrawlingEvent(self, beetleCrawlingEvent):
-        for listener in self.beetleCrawlingListeners:
-            listener.beetleCrawling(beetleCrawlingEvent)
-
-    def addPlayerFallingListener(self, playerFallingListener):
-        self.playerFallingListeners.append(playerFallingListener)
-
-    def dispatchPlayerFallingEvent(self, playerFallingEvent):
-        for listener in self.playerFallingListeners:
-            listener.playerFalling(playerFallingEvent)
-            
\ No newline at end of file
+    def setTracer(self, tracer):
+        self.tracer = tracer
+
+    def addListener(self, eventType, listener, queued = False):
+        method = getattr(listener, LISTENER_METHODS[eventType])
+        if queued:
+            self.queuedListeners[eventType].append(method)
+        else:
+            self.listeners[eventType].append(method)
+
+    def dispatch(self, event):
+        eventType = event.__class__
+        self.raisedCounts[eventType] += 1
+        if self.tracer:
+            self.tracer.record(event)
+        listeners = self.listeners[eventType]
+        if listeners:
+            for listener in listeners:
+                listener(event)
+            self.deliveredCounts[eventType] += len(listeners)
+        if self.queuedListeners[eventType]:
+            key = event.getKey()
+            if key not in self.queue:
+                self.queue[key] = event
+
+    """
+    Delivers the queued events to the queued listeners in the order they were
+    first raised.
+    """
+    def flush(self):
+        if self.queue:
+            events = list(self.queue.values())
+            self.queue.clear()
+            for event in events:
+                eventType = event.__class__
+                listeners = self.queuedListeners[eventType]
+                for listener in listeners:
+                    listener(event)
+                self.deliveredCounts[eventType] += len(listeners)
+
+    """
+    Discards any queued events without delivering them.
+    """
+    def clearQueue(self):
+        self.queue.clear()
+
+    def getRaisedCount(self):
+        return sum(self.raisedCounts.values())
+
+    def getDeliveredCount(self):
+        return sum(self.deliveredCounts.values())
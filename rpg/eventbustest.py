@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+
+import unittest
+
+from .eventbus import EventBus
+from .events import CoinCollectedEvent, CoinMetadata, PlayerFootstepEvent, BeetleCrawlingEvent
+
+class Listener:
+
+    def __init__(self):
+        self.events = []
+
+    def coinCollected(self, coinCollectedEvent):
+        self.events.append(coinCollectedEvent)
+
+    def playerFootstep(self, playerFootstepEvent):
+        self.events.append(playerFootstepEvent)
+
+    def beetleCrawling(self, beetleCrawlingEvent):
+        self.events.append(beetleCrawlingEvent)
+
+class EventBusTest(unittest.TestCase):
+
+    def testImmediateDelivery(self):
+        eventBus, listener = EventBus(), Listener()
+        eventBus.addListener(CoinCollectedEvent, listener)
+        event = CoinCollectedEvent(CoinMetadata("central:coin:0"))
+        eventBus.dispatch(event)
+        self.assertEqual([event], listener.events)
+        # events without listeners are still counted
+        eventBus.dispatch(PlayerFootstepEvent())
+        self.assertEqual(2, eventBus.getRaisedCount())
+        self.assertEqual(1, eventBus.getDeliveredCount())
+
+    def testQueuedEventsAreCoalesced(self):
+        eventBus, listener = EventBus(), Listener()
+        for eventType in (CoinCollectedEvent, PlayerFootstepEvent, BeetleCrawlingEvent):
+            eventBus.addListener(eventType, listener, True)
+        footstep = PlayerFootstepEvent()
+        coin0 = CoinCollectedEvent(CoinMetadata("central:coin:0"))
+        coin1 = CoinCollectedEvent(CoinMetadata("central:coin:1"))
+        beetle = BeetleCrawlingEvent((10, 20))
+        for event in (footstep, coin0, BeetleCrawlingEvent((10, 20)), PlayerFootstepEvent(), coin1, beetle):
+            eventBus.dispatch(event)
+        self.assertEqual([], listener.events)
+        eventBus.flush()
+        # the first of any duplicates is delivered, in the order raised
+        self.assertEqual([footstep, coin0, listener.events[2], coin1], listener.events)
+        self.assertIsInstance(listener.events[2], BeetleCrawlingEvent)
+        self.assertEqual(6, eventBus.raisedCounts[PlayerFootstepEvent] + eventBus.raisedCounts[CoinCollectedEvent]
+                         + eventBus.raisedCounts[BeetleCrawlingEvent])
+        self.assertEqual(4, eventBus.getDeliveredCount())
+        eventBus.flush()
+        self.assertEqual(4, len(listener.events))
+
+    def testClearQueue(self):
+        eventBus, listener = EventBus(), Listener()
+        eventBus.addListener(PlayerFootstepEvent, listener, True)
+        eventBus.dispatch(PlayerFootstepEvent())
+        eventBus.clearQueue()
+        eventBus.flush()
+        self.assertEqual([], listener.events)
+
+if __name__ == "__main__":
+    unittest.main()
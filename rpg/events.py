@@ -3,6 +3,12 @@
 class Event():    
     def getMetadata(self):
         pass
+    
+    """
+    Events with the same key are duplicates of each other.
+    """
+    def getKey(self):
+        return self.__class__
 
 class DoorOpeningEvent(Event):
     pass
@@ -19,10 +25,21 @@ class LifeLostEvent(Event):
 class EndGameEvent(Event):
     pass
 
-class WaspZoomingEvent(Event):
+"""
+An event raised by a sprite at the given map position, eg. a sprite sound.
+"""
+class PositionalEvent(Event):
+    
+    def __init__(self, position):
+        self.position = position
+        
+    def getKey(self):
+        return self.__class__, self.position
+
+class WaspZoomingEvent(PositionalEvent):
     pass
 
-class BeetleCrawlingEvent(Event):
+class BeetleCrawlingEvent(PositionalEvent):
     pass
 
 class PlayerFallingEvent(Event):
@@ -37,6 +54,9 @@ class MetadataEvent(Event):
         
     def getMetadata(self):
         return self.metadata
+    
+    def getKey(self):
+        return self.__class__, self.metadata.uid
         
 class CoinCollectedEvent(MetadataEvent):
     def __init__(self, metadata):
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+import json
+import time
+
+from array import array
+
+EVENT_CAPACITY = 4096
+FRAME_CAPACITY = 1024
+
+TRACE_FILE = "trace.json"
+
+"""
+Records dispatched events, named marks (eg. state transitions) and frame
+timings into fixed size ring buffers.  Once a buffer is full the oldest
+entries are overwritten.  The contents can be written out as a Chrome trace
+(load it into chrome://tracing or https://ui.perfetto.dev) to see a timeline of
+events against frame times.
+
+The tracer is attached to the event bus with EventBus.setTracer - when no
+tracer is attached the only cost is a single attribute test per dispatch.
+"""
+class EventTracer:
+
+    def __init__(self, eventCapacity = EVENT_CAPACITY, frameCapacity = FRAME_CAPACITY):
+        self.eventCapacity = eventCapacity
+        self.frameCapacity = frameCapacity
+        # events are either Event instances or mark names
+        self.events = [None] * eventCapacity
+        self.eventFrames = array("I", [0]) * eventCapacity
+        self.eventTimes = array("d", [0]) * eventCapacity
+        self.eventCount = 0
+        # frame start + end times
+        self.frameStarts = array("d", [0]) * frameCapacity
+        self.frameEnds = array("d", [0]) * frameCapacity
+        self.frameCount = 0
+        self.frameStart = None
+        self.startTime = time.perf_counter()
+
+    def record(self, event):
+        index = self.eventCount % self.eventCapacity
+        self.events[index] = event
+        self.eventFrames[index] = self.frameCount
+        self.eventTimes[index] = time.perf_counter()
+        self.eventCount += 1
+
+    def mark(self, name):
+        self.record(name)
+
+    def beginFrame(self):
+        self.frameStart = time.perf_counter()
+
+    def endFrame(self):
+        if self.frameStart is None:
+            return
+        index = self.frameCount % self.frameCapacity
+        self.frameStarts[index] = self.frameStart
+        self.frameEnds[index] = time.perf_counter()
+        self.frameCount += 1
+        self.frameStart = None
+
+    def getTimestamp(self, seconds):
+        # chrome traces are in microseconds
+        return round((seconds - self.startTime) * 1000000, 1)
+
+    """
+    Returns the recorded entries as a list of Chrome trace events, oldest first.
+    """
+    def getTraceEvents(self):
+        traceEvents = []
+        for i in range(max(0, self.frameCount - self.frameCapacity), self.frameCount):
+            index = i % self.frameCapacity
+            start = self.frameStarts[index]
+            traceEvents.append({"name": "frame",
+                                "cat": "frame",
+                                "ph": "X",
+                                "ts": self.getTimestamp(start),
+                                "dur": round((self.frameEnds[index] - start) * 1000000, 1),
+                                "pid": 1,
+                                "tid": 1,
+                                "args": {"frame": i}})
+        for i in range(max(0, self.eventCount - self.eventCapacity), self.eventCount):
+            index = i % self.eventCapacity
+            event = self.events[index]
+            args = {"frame": self.eventFrames[index]}
+            if isinstance(event, str):
+                name, category = event, "mark"
+            else:
+                name, category = event.__class__.__name__, "event"
+                metadata = event.getMetadata()
+                if metadata:
+                    args["uid"] = metadata.uid
+            traceEvents.append({"name": name,
+                                "cat": category,
+                                "ph": "i",
+                                "s": "g",
+                                "ts": self.getTimestamp(self.eventTimes[index]),
+                                "pid": 1,
+                                "tid": 1,
+                                "args": args})
+        return traceEvents
+
+    def dump(self, path = TRACE_FILE):
+        with open(path, "w") as traceFile:
+            json.dump({"traceEvents": self.getTraceEvents(), "displayTimeUnit": "ms"}, traceFile)
+        print("trace written: %s" % path)
@@ -0,0 +1,55 @@
+#! /usr/bin/env python
+
+import json
+import os
+import tempfile
+import unittest
+
+from .eventbus import EventBus
+from .eventtrace import EventTracer
+from .events import CoinCollectedEvent, CoinMetadata, PlayerFootstepEvent
+
+class EventTracerTest(unittest.TestCase):
+
+    def testEventsAreTraced(self):
+        eventBus, tracer = EventBus(), EventTracer()
+        eventBus.setTracer(tracer)
+        tracer.beginFrame()
+        eventBus.dispatch(CoinCollectedEvent(CoinMetadata("central:coin:0")))
+        tracer.mark("SceneTransition")
+        tracer.endFrame()
+        tracer.beginFrame()
+        eventBus.dispatch(PlayerFootstepEvent())
+        tracer.endFrame()
+        traceEvents = tracer.getTraceEvents()
+        self.assertEqual(["frame", "frame", "CoinCollectedEvent", "SceneTransition", "PlayerFootstepEvent"],
+                         [traceEvent["name"] for traceEvent in traceEvents])
+        self.assertEqual({"frame": 0, "uid": "central:coin:0"}, traceEvents[2]["args"])
+        self.assertEqual("mark", traceEvents[3]["cat"])
+        self.assertEqual(1, traceEvents[4]["args"]["frame"])
+        self.assertGreaterEqual(traceEvents[1]["ts"], traceEvents[0]["ts"])
+
+    def testOldestEntriesAreOverwritten(self):
+        tracer = EventTracer(4, 2)
+        for i in range(10):
+            tracer.beginFrame()
+            tracer.mark(str(i))
+            tracer.endFrame()
+        traceEvents = tracer.getTraceEvents()
+        self.assertEqual([8, 9], [traceEvent["args"]["frame"] for traceEvent in traceEvents[:2]])
+        self.assertEqual(["6", "7", "8", "9"], [traceEvent["name"] for traceEvent in traceEvents[2:]])
+
+    def testDump(self):
+        tracer = EventTracer()
+        tracer.mark("test")
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            tracer.dump(path)
+            with open(path) as traceFile:
+                self.assertEqual("test", json.load(traceFile)["traceEvents"][0]["name"])
+        finally:
+            os.remove(path)
+
+if __name__ == "__main__":
+    unittest.main()
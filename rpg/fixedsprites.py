@@ -121,6 +121,10 @@ class Lives(FixedSprite):
         self.newImage()
         print("lives:", self.count)
         
+    def setCount(self, count):
+        self.count = count
+        self.newImage()
+        
     def noneLeft(self):
         return self.count < 0
 
@@ -142,6 +146,11 @@ class CheckpointIcon(FixedSprite):
     def activate(self):
         self.ticks = 0
         
+    def reset(self):
+        self.setImage(self.offImage)
+        self.on = False
+        self.ticks = -1
+        
     def update(self):
         # test if the icon is active
         if self.ticks < 0:
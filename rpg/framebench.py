@@ -0,0 +1,193 @@
+#! /usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import random
+
+# run without a display or sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+# initialise pygame before the states module opens the display
+pygame.mixer.pre_init(44100, -16, 2, 1024)
+pygame.init()
+
+from pygame.locals import K_UP, K_DOWN, K_LEFT, K_RIGHT, K_SPACE
+from . import states, gameloop
+from .registry import Registry
+from .replay import loadReplay
+
+"""
+Times every frame of a set of recorded play-throughs in headless mode and
+reports frame time percentiles for each type of state.  Run from the top level
+folder with:
+
+python -m rpg.framebench [--runs n] [--output file] [--compare baseline [--tolerance t]]
+python -m rpg.framebench --record
+
+The results are written as json.  With --compare the results are also checked
+against an earlier results file, and the exit status is 1 if any percentile is
+more than the tolerance (REGRESSION_TOLERANCE by default) slower.  --record
+recreates the play-throughs, which is only needed if a change to the game means
+they no longer replay to the same end state.
+"""
+
+REPLAYS_FOLDER = "replays"
+RESULTS_FILE = "framebench.json"
+
+# name, starting registry + random seed for each play-through
+WORKLOADS = [("central", ("central", (6, 22), 2), 0),
+             ("east", ("east", (10, 18), 1), 1),
+             ("caves", ("caves", (11, 15), 1), 4),
+             ("northcave", ("northcave", (7, 15), 1), 3),
+             ("wasps", ("wasps", (12, 10), 5), 2)]
+
+WORKLOAD_FRAMES = 6000
+
+STATES = ["PlayState", "SceneTransitionState", "BoundaryTransitionState", "ShowPlayerState"]
+
+PERCENTILES = [("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)]
+
+RUNS = 3
+
+# allowed slowdown before a percentile is flagged as a regression - max is
+# too noisy to compare
+REGRESSION_TOLERANCE = 0.2
+COMPARED_PERCENTILES = ["p50", "p95", "p99"]
+
+def getWorkloadScript(seed, frameCount):
+    rnd = random.Random(seed)
+    script = []
+    for i in range(frameCount):
+        if i % 60 == 0:
+            direction = rnd.choice([K_UP, K_DOWN, K_LEFT, K_RIGHT, K_UP, K_RIGHT, K_LEFT])
+        script.append((1, [direction, K_SPACE] if i % 7 == 0 else [direction]))
+    return script
+
+def getReplayPath(name):
+    return os.path.join(REPLAYS_FOLDER, name + ".rec")
+
+def recordWorkloads():
+    for name, start, seed in WORKLOADS:
+        gameLoop = gameloop.GameLoop()
+        gameLoop.start(registry = Registry(*start))
+        gameLoop.startRecording()
+        gameloop.runHeadless(gameLoop, gameloop.ScriptedInput(getWorkloadScript(seed, WORKLOAD_FRAMES)), WORKLOAD_FRAMES)
+        gameLoop.recorder.save(states.player, states.registryHandler.registry, getReplayPath(name))
+        print("%s: %s" % (name, gameLoop.stateCounts))
+
+"""
+Plays the named replay and adds the time taken by each frame to frameTimes,
+keyed on the type of state that ran the frame.  Returns True if the replay
+ended in the recorded state.
+"""
+def timeReplay(name, frameTimes):
+    replay = loadReplay(getReplayPath(name))
+    gameLoop = gameloop.GameLoop()
+    gameLoop.start(registry = replay.registry)
+    scriptedInput = gameloop.ScriptedInput(replay.getScript())
+    states.setHeadless()
+    timer = time.perf_counter
+    for i in range(replay.frameCount):
+        stateName = gameLoop.currentState.__class__.__name__
+        keyPresses = scriptedInput.getKeyPresses()
+        start = timer()
+        gameLoop.step(keyPresses)
+        frameTimes.setdefault(stateName, []).append(timer() - start)
+    return replay.verify(states.player, states.registryHandler.registry)
+
+"""
+Returns the nearest rank percentile of the given sorted values.
+"""
+def getPercentile(sortedValues, percentile):
+    rank = max(1, -(-len(sortedValues) * percentile // 100))
+    return sortedValues[rank - 1]
+
+def getStateResults(frameTimes):
+    results = {}
+    for stateName in STATES:
+        times = sorted(frameTimes.get(stateName, []))
+        if times:
+            result = {"frames": len(times)}
+            for key, percentile in PERCENTILES:
+                # in milliseconds
+                result[key] = round(getPercentile(times, percentile) * 1000, 4)
+            results[stateName] = result
+    return results
+
+def runBenchmark(runs):
+    frameTimes = {}
+    replays = {}
+    # the first pass warms up the asset + map caches and is not counted
+    for name, start, seed in WORKLOADS:
+        replays[name] = timeReplay(name, {})
+    for run in range(runs):
+        for name, start, seed in WORKLOADS:
+            replays[name] = timeReplay(name, frameTimes) and replays[name]
+    return {"runs": runs,
+            "replays": replays,
+            "states": getStateResults(frameTimes)}
+
+"""
+Returns a list of (state, percentile, baseline ms, ms) for each percentile that
+is slower than the baseline by more than the tolerance.
+"""
+def getRegressions(results, baseline, tolerance = REGRESSION_TOLERANCE):
+    regressions = []
+    for stateName, result in results["states"].items():
+        baselineResult = baseline["states"].get(stateName)
+        if not baselineResult:
+            continue
+        for key in COMPARED_PERCENTILES:
+            if result[key] > baselineResult[key] * (1 + tolerance):
+                regressions.append((stateName, key, baselineResult[key], result[key]))
+    return regressions
+
+def printResults(results, baseline = None):
+    print("%-24s %8s %8s %8s %8s %8s" % ("state (ms)", "frames", "p50", "p95", "p99", "max"))
+    for stateName in STATES:
+        result = results["states"].get(stateName)
+        if result:
+            print("%-24s %8d %8.3f %8.3f %8.3f %8.3f" % (stateName, result["frames"],
+                                                         result["p50"], result["p95"],
+                                                         result["p99"], result["max"]))
+            if baseline and stateName in baseline["states"]:
+                baselineResult = baseline["states"][stateName]
+                print("%-24s %8d %8.3f %8.3f %8.3f %8.3f" % ("  baseline", baselineResult["frames"],
+                                                             baselineResult["p50"], baselineResult["p95"],
+                                                             baselineResult["p99"], baselineResult["max"]))
+    for name, verified in results["replays"].items():
+        if not verified:
+            print("warning: %s no longer replays to the recorded state - see --record" % name)
+
+def main(args):
+    if "--record" in args:
+        recordWorkloads()
+        return 0
+    runs = int(args[args.index("--runs") + 1]) if "--runs" in args else RUNS
+    output = args[args.index("--output") + 1] if "--output" in args else RESULTS_FILE
+    baseline = None
+    if "--compare" in args:
+        with open(args[args.index("--compare") + 1]) as baselineFile:
+            baseline = json.load(baselineFile)
+    results = runBenchmark(runs)
+    with open(output, "w") as resultsFile:
+        json.dump(results, resultsFile, indent = 2, sort_keys = True)
+    printResults(results, baseline)
+    print("results written: %s" % output)
+    if baseline:
+        tolerance = float(args[args.index("--tolerance") + 1]) if "--tolerance" in args else REGRESSION_TOLERANCE
+        regressions = getRegressions(results, baseline, tolerance)
+        for stateName, key, baselineTime, frameTime in regressions:
+            print("regression: %s %s %.3f -> %.3f ms" % (stateName, key, baselineTime, frameTime))
+        if regressions:
+            return 1
+        print("no regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
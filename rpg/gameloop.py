@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+
+import time
+import random
+
+from pygame.locals import K_UP, K_DOWN, K_LEFT, K_RIGHT, K_SPACE
+from . import states
+from .replay import InputRecorder
+from .view import FRAMES_PER_SEC
+
+# the most ticks that can be run without being shown before one is shown
+MAX_FRAME_SKIP = 5
+
+"""
+The keys held down for one frame of scripted input.  This can be indexed by
+key just like the sequence returned by pygame.key.get_pressed, so it can be
+passed straight to the game states.
+"""
+class KeyPresses:
+
+    def __init__(self, keys = ()):
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+NO_KEYS = KeyPresses()
+
+"""
+Plays back a script of key presses.  The script is a list of (frames, keys)
+steps - each step holds down the given keys for that many frames.  Once the
+script is finished no keys are pressed.
+"""
+class ScriptedInput:
+
+    def __init__(self, script):
+        self.steps = [(frames, KeyPresses(keys)) for frames, keys in script if frames > 0]
+        self.stepIndex = 0
+        self.frames = 0
+
+    def isFinished(self):
+        return self.stepIndex == len(self.steps)
+
+    def getKeyPresses(self):
+        if self.stepIndex == len(self.steps):
+            return NO_KEYS
+        frames, keyPresses = self.steps[self.stepIndex]
+        self.frames += 1
+        if self.frames == frames:
+            self.stepIndex += 1
+            self.frames = 0
+        return keyPresses
+
+"""
+Returns a script that wanders about at random for the given number of frames,
+pressing space every so often to take actions and to restart after the game is
+over.  The same seed always gives the same script.
+"""
+def getRandomScript(seed, frameCount):
+    rnd = random.Random(seed)
+    script = []
+    frames = 0
+    while frames < frameCount:
+        direction = rnd.choice([K_UP, K_DOWN, K_LEFT, K_RIGHT])
+        steps = [(rnd.randint(30, 240), [direction]), (1, [direction, K_SPACE])]
+        for step in steps:
+            script.append(step)
+            frames += step[0]
+    return script
+
+"""
+Works out how many ticks of the game to run to keep up with real time.  Each
+tick is 1 / ticksPerSec seconds of game time, which is what the per tick
+constants in the game - eg. MOVE_UNIT and the sprite frameSkip values - are
+tuned for.  Time that has passed is added to an accumulator, and a tick is run
+for each whole tick's worth of time in it, so the game runs at the same speed
+however fast the frames are shown.
+
+Only the last of the ticks due at any one time is shown - the others are
+skipped frames.  If the game falls more than maxFrameSkip frames behind the
+extra time is dropped, so the game slows down rather than never showing a
+frame.
+"""
+class FixedTimestep:
+
+    def __init__(self, ticksPerSec = FRAMES_PER_SEC, maxFrameSkip = MAX_FRAME_SKIP):
+        self.tickTime = 1.0 / ticksPerSec
+        self.maxTicks = maxFrameSkip + 1
+        self.accumulator = 0.0
+        self.lastTime = None
+        # instrumentation
+        self.skippedCount = 0
+        self.droppedTime = 0.0
+
+    """
+    Adds the time passed since the last call and returns the number of ticks
+    now due.  The first call always returns one tick.
+    """
+    def advance(self, now):
+        if self.lastTime is None:
+            self.accumulator = self.tickTime
+        else:
+            self.accumulator += now - self.lastTime
+        self.lastTime = now
+        ticks = int(self.accumulator / self.tickTime)
+        if ticks > self.maxTicks:
+            dropped = (ticks - self.maxTicks) * self.tickTime
+            self.accumulator -= dropped
+            self.droppedTime += dropped
+            ticks = self.maxTicks
+        self.accumulator -= ticks * self.tickTime
+        if ticks:
+            self.skippedCount += ticks - 1
+        return ticks
+
+    """
+    Forgets the time passed since the last tick, eg. after waiting for input.
+    """
+    def reset(self):
+        self.lastTime = None
+
+    """
+    Waits until at least one tick is due and returns the number of ticks due.
+    """
+    def getTicks(self):
+        ticks = self.advance(time.perf_counter())
+        while not ticks:
+            time.sleep(self.tickTime - self.accumulator)
+            ticks = self.advance(time.perf_counter())
+        return ticks
+
+"""
+Runs the game states one tick at a time.  play.py drives this from the
+keyboard with a FixedTimestep, while headless runs drive it from scripted input
+as fast as they can.  pygame must be initialised before this module is
+imported, as the states module opens the display.
+"""
+class GameLoop:
+
+    def __init__(self, tracer = None):
+        # optional EventTracer
+        self.tracer = tracer
+        # optional InputRecorder - see startRecording
+        self.recorder = None
+        # optional cpuprofile.StateProfiler + StackSampler
+        self.stateProfiler = None
+        self.sampler = None
+        self.currentState = None
+        self.frameCount = 0
+        # frames spent in each type of state, keyed on class name
+        self.stateCounts = {}
+
+    def start(self, cont = False, registry = None):
+        self.currentState = states.startGame(cont, registry)
+        if self.tracer:
+            states.eventBus.setTracer(self.tracer)
+
+    """
+    Records the key presses from now on - this should be called straight after
+    start.  The recording is saved when the loop is closed.
+    """
+    def startRecording(self):
+        self.recorder = InputRecorder(states.registryHandler.registry)
+
+    """
+    Runs one tick of the current state.  When render is False the tick is not
+    shown, and the play state skips drawing the map view.
+    """
+    def step(self, keyPresses, render = True):
+        states.setRenderFrame(render)
+        if self.tracer:
+            self.tracer.beginFrame()
+        if self.recorder:
+            self.recorder.record(keyPresses)
+        stateName = self.currentState.__class__.__name__
+        if self.sampler:
+            self.sampler.beginFrame(stateName)
+        if self.stateProfiler:
+            self.stateProfiler.enable(stateName)
+        # delegate key presses to the current state
+        newState = self.currentState.execute(keyPresses)
+        if render:
+            states.flipDisplay()
+        # deliver queued events + flush sounds
+        states.eventBus.flush()
+        states.soundHandler.flush()
+        if self.stateProfiler:
+            self.stateProfiler.disable()
+        if self.sampler:
+            self.sampler.endFrame()
+        # change state if necessary
+        if newState:
+            self.currentState = newState
+        self.frameCount += 1
+        name = self.currentState.__class__.__name__
+        self.stateCounts[name] = self.stateCounts.get(name, 0) + 1
+        if self.tracer:
+            self.tracer.endFrame()
+
+    """
+    Returns True if the current state is only waiting for a key press, eg. the
+    game over screen once it is fully shown.  Nothing changes until a key is
+    pressed, so the caller can block on input rather than run the ticks.
+    States that can wait like this define isWaitingForInput.
+    """
+    def isWaitingForInput(self):
+        return hasattr(self.currentState, "isWaitingForInput") and self.currentState.isWaitingForInput()
+
+    """
+    Called when the game is quit.  Waits for any autosave to complete and
+    writes out the trace, recording + profiles, if any.
+    """
+    def close(self):
+        states.registryHandler.close()
+        if self.tracer:
+            self.tracer.dump()
+        if self.stateProfiler:
+            self.stateProfiler.dump()
+        if self.sampler:
+            self.sampler.stop()
+            self.sampler.dump()
+        if self.recorder:
+            self.recorder.save(states.player, states.registryHandler.registry)
+
+"""
+Runs the given number of ticks, eg. as returned by FixedTimestep.getTicks.
+Only the last tick is shown - the rest are skipped frames.  getKeyPresses is
+called for the key presses for each tick.
+"""
+def runTicks(gameLoop, ticks, getKeyPresses):
+    for i in range(ticks):
+        gameLoop.step(getKeyPresses(), i == ticks - 1)
+
+"""
+Runs the loop for the given number of frames from scripted input, without
+showing the display or waiting between frames.  Returns the frames per second
+achieved.
+"""
+def runHeadless(gameLoop, scriptedInput, frameCount):
+    states.setHeadless()
+    start = time.perf_counter()
+    for i in range(frameCount):
+        gameLoop.step(scriptedInput.getKeyPresses())
+    return frameCount / (time.perf_counter() - start)
@@ -6,6 +6,7 @@ import math
 from . import view
 from . import mapevents
 
+from pygame.locals import Rect
 from .view import TILE_SIZE
 
 MIN_SHUFFLE = (0, -1, -1, 1)
@@ -18,12 +19,16 @@ and mapEvents will be populated from the named map file.
 """
 class RpgMap:
     
-    def __init__(self, name, mapTiles, mapSprites, mapEvents):
+    def __init__(self, name, mapTiles, mapSprites, mapEvents, music = None):
         self.name = name
+        # background music track, if any
+        self.music = music
         self.mapTiles = mapTiles
         self.cols = len(mapTiles)
         self.rows = len(mapTiles[0])
         self.mapSprites = mapSprites
+        # levels added by map actions - these are removed by resetLevels
+        self.addedLevels = []
         self.initialiseMapImage()
         self.initialiseEvents(mapEvents)
         
@@ -207,6 +212,15 @@ class RpgMap:
     
     def addLevel(self, x, y, level):
         self.mapTiles[x][y].addLevel(level)
+        self.addedLevels.append((x, y, level))
+        
+    """
+    Removes any levels added since the map was loaded, eg. by an open door.
+    """
+    def resetLevels(self):
+        for x, y, level in self.addedLevels:
+            self.mapTiles[x][y].removeLevel(level)
+        self.addedLevels = []
 
 """
 A repository of named tile images.  Instances of this class are created and used
@@ -239,6 +253,9 @@ class MapTile:
     def addLevel(self, level):
         self.levels.append(level)
         
+    def removeLevel(self, level):
+        self.levels.remove(level)
+        
     def addTile(self, tile):
         self.tiles.append(tile)
         
@@ -365,4 +382,10 @@ class MapSprite:
         self.uid = uid
         self.level = level
         self.tilePoints = tilePoints
+        # the area covered by the sprite's tile points
+        xs = [tilePoint[0] for tilePoint in tilePoints]
+        ys = [tilePoint[1] for tilePoint in tilePoints]
+        self.mapRect = Rect(min(xs) * TILE_SIZE, min(ys) * TILE_SIZE,
+                            (max(xs) - min(xs) + 1) * TILE_SIZE,
+                            (max(ys) - min(ys) + 1) * TILE_SIZE)
             
\ No newline at end of file
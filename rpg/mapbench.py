@@ -0,0 +1,190 @@
+#! /usr/bin/env python
+
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+
+# run without a display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from pygame.locals import Rect
+from . import parser
+
+from .view import TILE_SIZE
+from .sprites import BASE_RECT_HEIGHT
+
+"""
+Micro-benchmarks for the RpgMap spatial queries, run against the shipped maps
+and against large maps generated by tiling a shipped map.  Run from the top
+level folder with:
+
+python -m rpg.mapbench [map ...] [--scale n] [--queries n]
+
+Each query is run over the same set of player positions picked at random from
+the tiles that have levels, so the results are repeatable.  Reports the time
+taken per call in ns/op - this includes calling through a small wrapper, so
+compare results with each other rather than reading them as absolutes - and
+the memory allocated per call in B/op.  CPython doesn't count allocations, so
+B/op is the peak memory traced by tracemalloc during a call - ie. everything
+that call allocates that is not freed before it allocates the next thing.
+This is measured in a separate, untimed pass.
+"""
+
+MAPS = ["central", "east", "caves", "northcave", "wasps"]
+
+# the generated maps tile this map scale x scale times
+GENERATED_MAP = "central"
+GENERATED_SCALE = 3
+
+QUERY_COUNT = 2000
+# timed passes over the queries - the fastest is reported
+RUNS = 5
+
+# the player's map rect + base rect
+PLAYER_SIZE = (28, 48)
+BASE_RECT_SIZE = (28, BASE_RECT_HEIGHT)
+
+"""
+Stands in for a sprite in calls to getMasks.
+"""
+class QuerySprite:
+
+    def __init__(self, mapRect, level):
+        self.mapRect = mapRect
+        self.level = level
+        self.upright = True
+        self.z = int(mapRect.bottom + level * TILE_SIZE)
+
+"""
+Writes a map file that repeats the tiles of the named map scale x scale times.
+Sprites + events are left out.  Returns the name of the generated map, which
+is in the given folder.
+"""
+def generateMap(name, scale, folder):
+    tileLines = []
+    cols, rows = 0, 0
+    with open(os.path.join(parser.MAPS_FOLDER, name + ".map")) as mapFile:
+        for line in mapFile:
+            bits = line.split()
+            if not bits or bits[0] in (parser.SPRITE, parser.TRIGGER, parser.MUSIC):
+                continue
+            x, y = parser.getXY(bits[0])
+            cols, rows = max(cols, x + 1), max(rows, y + 1)
+            tileLines.append((x, y, " ".join(bits[1:])))
+    generatedName = "%s-x%d" % (name, scale)
+    with open(os.path.join(folder, generatedName + ".map"), "w") as mapFile:
+        for i in range(scale):
+            for j in range(scale):
+                for x, y, tileData in tileLines:
+                    mapFile.write("%d,%d %s\n" % (x + i * cols, y + j * rows, tileData))
+    return generatedName
+
+def loadGeneratedMap(name, scale):
+    folder = tempfile.mkdtemp()
+    mapsFolder = parser.MAPS_FOLDER
+    try:
+        generatedName = generateMap(name, scale, folder)
+        # the tile sets are still loaded from the usual folder
+        parser.MAPS_FOLDER = folder
+        return parser.loadRpgMap(generatedName)
+    finally:
+        parser.MAPS_FOLDER = mapsFolder
+        for fileName in os.listdir(folder):
+            os.remove(os.path.join(folder, fileName))
+        os.rmdir(folder)
+
+"""
+Returns a list of (level, baseRect, sprite) queries at random positions on
+tiles that have levels.
+"""
+def getQueries(rpgMap, queryCount, seed = 0):
+    rnd = random.Random(seed)
+    tiles = [tile for column in rpgMap.mapTiles for tile in column if tile.levels]
+    queries = []
+    for i in range(queryCount):
+        tile = rnd.choice(tiles)
+        level = rnd.choice(tile.levels)
+        px = tile.x * TILE_SIZE + rnd.randrange(TILE_SIZE)
+        py = tile.y * TILE_SIZE + rnd.randrange(TILE_SIZE)
+        baseRect = Rect((px, py), BASE_RECT_SIZE)
+        mapRect = Rect((px, py + BASE_RECT_SIZE[1] - PLAYER_SIZE[1]), PLAYER_SIZE)
+        queries.append((level, baseRect, QuerySprite(mapRect, level)))
+    return queries
+
+"""
+Returns the queries to benchmark as (name, function) pairs.  Each function is
+called with a query.
+"""
+def getBenchmarks(rpgMap):
+    # the stripe queries use the tiles cached by getBaseRectTiles, just as they
+    # follow isMoveValid in play
+    def isVerticalValid(level, baseRect, sprite):
+        rpgMap.getBaseRectTiles(baseRect)
+        return rpgMap.isVerticalValid(level, baseRect)
+    def isHorizontalValid(level, baseRect, sprite):
+        rpgMap.getBaseRectTiles(baseRect)
+        return rpgMap.isHorizontalValid(level, baseRect)
+    def testValidity(level, baseRect, sprite):
+        return rpgMap.mapTiles[baseRect.left // TILE_SIZE][baseRect.top // TILE_SIZE].testValidity(level)
+    return [("isMoveValid", lambda level, baseRect, sprite: rpgMap.isMoveValid(level, baseRect)),
+            ("getBaseRectTiles", lambda level, baseRect, sprite: rpgMap.getBaseRectTiles(baseRect)),
+            ("isVerticalValid*", isVerticalValid),
+            ("isHorizontalValid*", isHorizontalValid),
+            ("getMasks", lambda level, baseRect, sprite: rpgMap.getMasks(sprite)),
+            ("getSpanTiles", lambda level, baseRect, sprite: rpgMap.getSpanTiles(sprite.mapRect)),
+            ("getActions", lambda level, baseRect, sprite: rpgMap.getActions(level, baseRect)),
+            ("testValidity", testValidity)]
+
+def timeBenchmark(function, queries):
+    timer = time.perf_counter_ns
+    best = None
+    for run in range(RUNS):
+        start = timer()
+        for level, baseRect, sprite in queries:
+            function(level, baseRect, sprite)
+        elapsed = timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(queries)
+
+def measureAllocations(function, queries):
+    total = 0
+    tracemalloc.start()
+    try:
+        for level, baseRect, sprite in queries:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            function(level, baseRect, sprite)
+            total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return total / len(queries)
+
+def runBenchmarks(rpgMap, queryCount):
+    queries = getQueries(rpgMap, queryCount)
+    print("%s (%d x %d tiles)" % (rpgMap.name, rpgMap.cols, rpgMap.rows))
+    for name, function in getBenchmarks(rpgMap):
+        nsPerOp = timeBenchmark(function, queries)
+        bytesPerOp = measureAllocations(function, queries)
+        print("  %-20s %8.0f ns/op %8.0f B/op" % (name, nsPerOp, bytesPerOp))
+
+def main(args):
+    scale = int(args[args.index("--scale") + 1]) if "--scale" in args else GENERATED_SCALE
+    queryCount = int(args[args.index("--queries") + 1]) if "--queries" in args else QUERY_COUNT
+    names = [arg for i, arg in enumerate(args) if not arg.startswith("--") and (i == 0 or not args[i - 1].startswith("--"))]
+    for name in names or MAPS:
+        runBenchmarks(parser.loadRpgMap(name), queryCount)
+    if not names and scale > 1:
+        runBenchmarks(loadGeneratedMap(GENERATED_MAP, scale), queryCount)
+    print("* includes getBaseRectTiles")
+
+if __name__ == "__main__":
+    # tile images need a display mode to be set
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    main(sys.argv[1:])
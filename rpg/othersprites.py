@@ -28,21 +28,25 @@ ZOOM_MOVEMENT = {UP: (0, -2 * MOVE_UNIT, UP_METADATA),
 class Beetle(OtherSprite):
     
     framesImage = None
+    animationFrames = None
     
     baseRectSize = (12 * SCALAR, 12 * SCALAR)
     
     def __init__(self):
         if Beetle.framesImage is None:    
             imagePath = os.path.join(SPRITES_FOLDER, "beetle-frames.png")
-            Beetle.framesImage = view.loadScaledImage(imagePath, None)        
-        animationFrames = view.processMovementFrames(Beetle.framesImage, 2)
-        spriteFrames = DirectionalFrames(animationFrames, 12)
+            Beetle.framesImage = view.loadScaledImage(imagePath, None)
+            Beetle.animationFrames = view.copyMovementFrames(view.processMovementFrames(Beetle.framesImage, 2))
+        spriteFrames = DirectionalFrames(Beetle.animationFrames, 12)
         OtherSprite.__init__(self, spriteFrames)
         self.upright = False
 
     def processCollision(self, player):
         player.loseLife()
         return True
+
+    def isStatic(self):
+        return False
     
     # initialises a 'robot' movement strategy - moving along the given list of tiles
     def initMovement(self, level, tilePoints):
@@ -75,27 +79,40 @@ class Beetle(OtherSprite):
         # otherwise there is nowhere to move to
         return NO_MOVEMENT
     
+    def getRewindState(self):
+        x, y, extra, frameCount, frameIndex, direction = OtherSprite.getRewindState(self)
+        return x, y, self.pathPointIndex, frameCount, frameIndex, direction
+        
+    def setRewindState(self, x, y, extra, frameCount, frameIndex, direction):
+        OtherSprite.setRewindState(self, x, y, extra, frameCount, frameIndex, direction)
+        self.pathPointIndex = extra
+        self.currentPathPoint = self.pathPoints[extra]
+    
     def playSound(self, frameIndex):
         if frameIndex == 1:
-            self.eventBus.dispatchBeetleCrawlingEvent(BeetleCrawlingEvent())
+            self.eventBus.dispatch(BeetleCrawlingEvent(self.mapRect.center))
         
 class Wasp(OtherSprite):
     
     framesImage = None
+    animationFrames = None
     
     baseRectSize = (9 * SCALAR, 12 * SCALAR)    
 
     def __init__(self):
         if Wasp.framesImage is None:    
             imagePath = os.path.join(SPRITES_FOLDER, "wasp-frames.png")
-            Wasp.framesImage = view.loadScaledImage(imagePath, None)        
-        animationFrames = view.processMovementFrames(Wasp.framesImage, 2)
-        spriteFrames = DirectionalFrames(animationFrames, 4)
+            Wasp.framesImage = view.loadScaledImage(imagePath, None)
+            Wasp.animationFrames = view.copyMovementFrames(view.processMovementFrames(Wasp.framesImage, 2))
+        spriteFrames = DirectionalFrames(Wasp.animationFrames, 4)
         OtherSprite.__init__(self, spriteFrames)
         
     def processCollision(self, player):
         player.loseLife()
         return True
+
+    def isStatic(self):
+        return False
     
     # initialises a 'zoom' movement strategy - zooming towards the player vertically/horizontally
     def initMovement(self, level, tilePoints):
@@ -128,6 +145,20 @@ class Wasp(OtherSprite):
             self.countdown -= 1
             if self.countdown == 0:
                 self.zooming = True
-                self.eventBus.dispatchWaspZoomingEvent(WaspZoomingEvent())
+                self.eventBus.dispatch(WaspZoomingEvent(self.mapRect.center))
         return NO_MOVEMENT
-    
\ No newline at end of file
+    
+
+    """
+    The countdown, zoom direction and zooming flag are packed into extra.
+    """
+    def getRewindState(self):
+        x, y, extra, frameCount, frameIndex, direction = OtherSprite.getRewindState(self)
+        extra = self.countdown + ((self.direction or 0) << 8) + (self.zooming << 16)
+        return x, y, extra, frameCount, frameIndex, direction
+        
+    def setRewindState(self, x, y, extra, frameCount, frameIndex, direction):
+        OtherSprite.setRewindState(self, x, y, extra, frameCount, frameIndex, direction)
+        self.countdown = extra & 0xFF
+        self.direction = ((extra >> 8) & 0xFF) or None
+        self.zooming = bool(extra >> 16)
@@ -21,11 +21,19 @@ COLON = ":"
 COMMA = ","
 SPRITE = "sprite"
 TRIGGER = "event"
+MUSIC = "music"
 #PIPE = "|"
 DASH = "-"
 
 BOUNDARIES = {"up": UP, "down": DOWN, "left": LEFT, "right": RIGHT}
 
+# maps + tile sets that have already been loaded, keyed on name
+rpgMaps = {}
+tileSets = {}
+# hits + misses for each cache, as shown by the frame profiler overlay
+mapCacheCounts = [0, 0]
+tileSetCacheCounts = [0, 0]
+
 def getXY(xyStr, delimiter = COMMA):
     return [int(n) for n in xyStr.split(delimiter)]
 
@@ -35,11 +43,28 @@ def getTilePoints(xyList, delimiter = COMMA):
         tilePoints.append(getXY(xy, delimiter))
     return tilePoints
     
+"""
+Returns the named map, only loading it from disk the first time it is requested.
+Any map actions that were applied to a cached map are reset before it is
+returned, so the caller must reapply them from the registry.
+"""
+def getRpgMap(name):
+    if name in rpgMaps:
+        mapCacheCounts[0] += 1
+        rpgMap = rpgMaps[name]
+        rpgMap.resetLevels()
+        return rpgMap
+    mapCacheCounts[1] += 1
+    rpgMap = loadRpgMap(name)
+    rpgMaps[name] = rpgMap
+    return rpgMap
+
 def loadRpgMap(name):
     # tileData is keyed on an x,y tuple
     tileData = {}
     spriteData = []
     eventData = []
+    music = None
     # parse map file - each line represents one map tile        
     mapPath = os.path.join(MAPS_FOLDER, name + ".map")
     print("loading: %s" % mapPath)
@@ -58,6 +83,10 @@ def loadRpgMap(name):
                         elif bits[0] == TRIGGER:
                             if len(bits) > 1:
                                 eventData.append(bits[1:])
+                        elif bits[0] == MUSIC:
+                            # eg. music caves.ogg
+                            if len(bits) > 1:
+                                music = bits[1]
                         else:                          
                             tilePoint = bits[0]
                             #print "%s -> %s" % (tileRef, tileName)
@@ -72,13 +101,12 @@ def loadRpgMap(name):
     mapSprites = createMapSprites(spriteData, name)
     mapEvents = createMapEvents(eventData)
     # create map and return
-    return map.RpgMap(name, mapTiles, mapSprites, mapEvents)
+    return map.RpgMap(name, mapTiles, mapSprites, mapEvents, music)
 
 def createMapTiles(cols, rows, tileData):
     # create the map tiles
     mapTiles = [[map.MapTile(x, y) for y in range(rows)] for x in range(cols)]
     # iterate through the tile data and set the map tiles
-    tileSets = {}     
     for tilePoint in list(tileData.keys()):
         bits = tileData[tilePoint]
         x, y = tilePoint[0], tilePoint[1]
@@ -101,12 +129,7 @@ def createMapTiles(cols, rows, tileData):
         for tileIndex, tiles in enumerate(bits[startIndex:]):
             tileBits = tiles.split(COLON)
             if len(tileBits) > 1:
-                tileSetName = tileBits[0]
-                if tileSetName in tileSets:
-                    tileSet = tileSets[tileSetName]
-                else:
-                    tileSet = loadTileSet(tileSetName)
-                    tileSets[tileSetName] = tileSet
+                tileSet = getTileSet(tileBits[0])
                 tileName = tileBits[1]
                 mapTile.addTile(tileSet.getTile(tileName))
                 # masks
@@ -119,6 +142,18 @@ def createMapTiles(cols, rows, tileData):
                         mapTile.addMask(tileIndex, int(maskLevel))
     return mapTiles
 
+"""
+Returns the named tile set, only loading it from disk the first time it is
+requested.  Tile images are never drawn on, so they can be shared between maps.
+"""
+def getTileSet(name):
+    if name in tileSets:
+        tileSetCacheCounts[0] += 1
+        return tileSets[name]
+    tileSetCacheCounts[1] += 1
+    tileSets[name] = loadTileSet(name)
+    return tileSets[name]
+
 def loadTileSet(name):
     # print "load tileset: %s" % (name)
     # tileSet = map.TileSet()
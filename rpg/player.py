@@ -69,6 +69,48 @@ class Player(RpgSprite):
     def setup(self, uid, rpgMap, eventBus):
         RpgSprite.setup(self, uid, rpgMap, eventBus)
         
+    """
+    Returns the player to its initial state so it can be reused for a new game.
+    The fixed sprites are not reset here.
+    """
+    def reset(self):
+        # remove the player from any groups belonging to the previous game
+        self.kill()
+        self.fallingFrames.reset()
+        self.spriteFrames = self.movingFrames
+        RpgSprite.reset(self)
+        self.movement = None
+        self.deferredMovement = None
+        self.shadow = None
+        self.ticks = 0
+        self.falling = 0
+        
+    """
+    Returns the state needed to rewind the player - see rewind.py.
+    """
+    def getRewindState(self):
+        frameCount, frameIndex, direction = self.spriteFrames.getState()
+        return (self.mapRect.left, self.mapRect.top, frameCount, frameIndex, direction,
+                self.getCoinCount(), self.getKeyCount()), self.level
+    
+    """
+    Restores the state returned by getRewindState.  Any movement in progress is
+    dropped, so the player resumes from a standstill.
+    """
+    def setRewindState(self, x, y, frameCount, frameIndex, direction, coinCount, keyCount, level):
+        self.movement = None
+        self.deferredMovement = None
+        self.ticks = 0
+        self.level = level
+        self.doMove(x - self.mapRect.left, y - self.mapRect.top)
+        self.clearMasks()
+        self.spriteFrames.restoreState(frameCount, frameIndex, direction)
+        self.image, frameIndex = self.spriteFrames.advanceFrame(0)
+        self.applyMasks()
+        self.updateViewRect()
+        self.setCoinCount(coinCount)
+        self.setKeyCount(keyCount)
+        
     """
     Base rect for the player extends beyond the bottom of the sprite image.
     """
@@ -220,7 +262,7 @@ class Player(RpgSprite):
         self.clearMasks()
         self.image, frameIndex = self.spriteFrames.advanceFrame(direction = myDirection)
         if frameIndex == 1 or frameIndex == 3:
-            self.eventBus.dispatchPlayerFootstepEvent(PLAYER_FOOTSTEP_EVENT)
+            self.eventBus.dispatch(PLAYER_FOOTSTEP_EVENT)
         self.applyMasks()
     
     """
@@ -307,7 +349,7 @@ class Player(RpgSprite):
             self.shadow = Shadow()
             self.shadow.setupFromPlayer(self, downLevel)
             gameSprites.add(self.shadow)
-            self.eventBus.dispatchPlayerFallingEvent(PLAYER_FALLING_EVENT)
+            self.eventBus.dispatch(PLAYER_FALLING_EVENT)
 
         return None
     
@@ -368,7 +410,7 @@ class Player(RpgSprite):
         self.keyCount.incrementCount(-1)
         
     def loseLife(self):
-        self.eventBus.dispatchLifeLostEvent(LIFE_LOST_EVENT)
+        self.eventBus.dispatch(LIFE_LOST_EVENT)
         self.lives.incrementCount(-1)
         
     def gameOver(self):
@@ -384,17 +426,19 @@ class Ulmo(Player):
     
     movingFramesImage = None
     fallingFramesImage = None
+    movingAnimationFrames = None
+    fallingAnimationFrames = None
     
     def __init__(self):
         if Ulmo.movingFramesImage is None:          
             imagePath = os.path.join(SPRITES_FOLDER, "ulmo-frames.png")
             Ulmo.movingFramesImage = view.loadScaledImage(imagePath, None)
+            Ulmo.movingAnimationFrames = view.copyMovementFrames(view.processMovementFrames(Ulmo.movingFramesImage))
         if Ulmo.fallingFramesImage is None:          
             imagePath = os.path.join(SPRITES_FOLDER, "ulmo-falling.png")
             Ulmo.fallingFramesImage = view.loadScaledImage(imagePath, None)
-        animationFrames = view.processMovementFrames(Ulmo.movingFramesImage)
-        movingFrames = DirectionalFrames(animationFrames, 6)
-        animationFrames = view.processStaticFrames(Ulmo.fallingFramesImage)
-        fallingFrames = StaticFrames(animationFrames)
+            Ulmo.fallingAnimationFrames = view.copyStaticFrames(view.processStaticFrames(Ulmo.fallingFramesImage))
+        movingFrames = DirectionalFrames(Ulmo.movingAnimationFrames, 6)
+        fallingFrames = StaticFrames(Ulmo.fallingAnimationFrames)
         Player.__init__(self, movingFrames, fallingFrames, (1, -12))
         
\ No newline at end of file
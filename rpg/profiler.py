@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+import time
+
+from array import array
+from . import view
+
+# the phases of PlayState.execute, in the order they run
+EVENTS = "events"
+COLLISIONS = "collide"
+INPUT = "input"
+BACKGROUND = "map"
+UPDATE = "update"
+DRAW = "draw"
+HUD = "hud"
+OVERLAY = "overlay"
+FLIP = "flip"
+
+PHASES = [EVENTS, COLLISIONS, INPUT, UPDATE, BACKGROUND, DRAW, HUD, OVERLAY, FLIP]
+
+# frames kept for the rolling stats
+WINDOW_SIZE = 120
+
+# the overlay text is only redrawn every so many frames
+OVERLAY_REFRESH = 15
+OVERLAY_ORIGIN = (4, 4)
+OVERLAY_ALPHA = 160
+
+"""
+Times the phases of each frame of play.  The time taken by each phase is kept
+in a ring buffer of WINDOW_SIZE frames, from which the rolling mean, max +
+percentiles of the completed frames are worked out.
+
+A frame here is one tick of the game loop.  Ticks that are skipped to catch up,
+or that have nothing new to show, are not drawn - markDrawn is called on the
+ticks that are, so the rate frames are actually drawn at can be told apart
+from the tick rate.
+
+Each frame starts with beginFrame.  After that each call to lap records the
+time since the previous lap (or since beginFrame) against the given phase.  A
+phase that is skipped in a frame, eg. drawing when there's a transition,
+records no time for that frame.
+
+The profiler is attached + detached with states.toggleProfiler - when no
+profiler is attached the only cost is a single test per phase.
+"""
+class FrameProfiler:
+
+    def __init__(self, windowSize = WINDOW_SIZE):
+        self.windowSize = windowSize
+        self.samples = dict((phase, array("d", [0]) * windowSize) for phase in PHASES)
+        self.frameTimes = array("d", [0]) * windowSize
+        # 1 for each frame that was drawn
+        self.drawnFlags = array("B", [0]) * windowSize
+        self.index = 0
+        self.count = 0
+        self.frameStart = None
+        self.lapStart = None
+        self.overlayImages = None
+        self.overlayFrames = 0
+
+    def beginFrame(self):
+        now = time.perf_counter()
+        index = self.index
+        if self.frameStart is not None:
+            # the time since the last frame began, ie. 1 / fps
+            self.frameTimes[index] = now - self.frameStart
+            self.index = index = (index + 1) % self.windowSize
+            # the current frame is not counted until it is complete
+            self.count = min(self.count + 1, self.windowSize - 1)
+        for samples in self.samples.values():
+            samples[index] = 0
+        self.drawnFlags[index] = 0
+        self.frameStart = self.lapStart = now
+
+    def markDrawn(self):
+        if self.frameStart is not None:
+            self.drawnFlags[self.index] = 1
+
+    def lap(self, phase):
+        if self.lapStart is None:
+            return
+        now = time.perf_counter()
+        self.samples[phase][self.index] += now - self.lapStart
+        self.lapStart = now
+
+    """
+    Forgets the previous frame, eg. after a transition.  This stops the time
+    spent elsewhere from being counted as a frame.
+    """
+    def pause(self):
+        self.frameStart = None
+        self.lapStart = None
+
+    def getValues(self, ring):
+        start = (self.index - self.count) % self.windowSize
+        return [ring[(start + i) % self.windowSize] for i in range(self.count)]
+
+    def getTicksPerSecond(self):
+        frameTimes = self.getValues(self.frameTimes)
+        if not frameTimes:
+            return 0
+        return len(frameTimes) / sum(frameTimes)
+
+    """
+    Returns the rate frames were drawn at, which drops below the tick rate when
+    frames are skipped.
+    """
+    def getFramesPerSecond(self):
+        frameTimes = self.getValues(self.frameTimes)
+        if not frameTimes:
+            return 0
+        return sum(self.getValues(self.drawnFlags)) / sum(frameTimes)
+
+    """
+    Returns the mean, 95th percentile + max time in milliseconds for the given
+    phase over the window.
+    """
+    def getStats(self, phase):
+        values = sorted(self.getValues(self.samples[phase]))
+        if not values:
+            return 0, 0, 0
+        p95 = values[max(0, -(-len(values) * 95 // 100) - 1)]
+        return (sum(values) * 1000 / len(values), p95 * 1000, values[-1] * 1000)
+
+    def getSummary(self):
+        lines = ["fps: %.1f ticks/s: %.1f" % (self.getFramesPerSecond(), self.getTicksPerSecond())]
+        for phase in PHASES:
+            lines.append("%-8s mean %.3f p95 %.3f max %.3f ms" % ((phase,) + self.getStats(phase)))
+        return "\n".join(lines)
+
+    # ==========================================================================
+
+    """
+    Returns the overlay text.  cacheCounts is a list of (name, (hits, misses))
+    for each cache, which is shown as hits/lookups.
+    """
+    def getOverlayLines(self, spriteCounts, cacheCounts):
+        visibleCount, gameCount = spriteCounts
+        lines = ["FPS %.1f" % self.getFramesPerSecond(),
+                 "TICKS %.1f" % self.getTicksPerSecond()]
+        for phase in PHASES:
+            lines.append("%s %.2f" % (phase.upper(), self.getStats(phase)[0]))
+        lines.append("SPRITES %d/%d" % (visibleCount, gameCount))
+        for name, (hits, misses) in cacheCounts:
+            lines.append("%s %d/%d" % (name, hits, hits + misses))
+        return lines
+
+    """
+    Draws the stats onto the given surface.  The text is only rendered every
+    OVERLAY_REFRESH frames - in between the same images are drawn again.
+    """
+    def drawOverlay(self, surface, gameFont, spriteCounts, cacheCounts):
+        if not self.overlayImages or self.overlayFrames >= OVERLAY_REFRESH:
+            lines = self.getOverlayLines(spriteCounts, cacheCounts)
+            textImages = [gameFont.getTextImage(line) for line in lines]
+            width = max(image.get_width() for image in textImages)
+            height = gameFont.charHeight
+            background = view.createRectangle((width + 4, height * len(lines) + 4), view.BLACK)
+            background.set_alpha(OVERLAY_ALPHA)
+            self.overlayImages = [(background, (OVERLAY_ORIGIN[0] - 2, OVERLAY_ORIGIN[1] - 2))]
+            for i, image in enumerate(textImages):
+                self.overlayImages.append((image, (OVERLAY_ORIGIN[0], OVERLAY_ORIGIN[1] + i * height)))
+            self.overlayFrames = 0
+        self.overlayFrames += 1
+        for image, position in self.overlayImages:
+            surface.blit(image, position)
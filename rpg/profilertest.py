@@ -0,0 +1,47 @@
+#! /usr/bin/env python
+
+import time
+import unittest
+
+from .profiler import FrameProfiler, EVENTS, DRAW, FLIP
+
+class FrameProfilerTest(unittest.TestCase):
+
+    def testLapsAreRecordedAgainstPhases(self):
+        profiler = FrameProfiler(4)
+        for i in range(3):
+            profiler.beginFrame()
+            time.sleep(0.002)
+            profiler.lap(EVENTS)
+            profiler.lap(FLIP)
+        # the last frame is still in progress
+        self.assertEqual(2, profiler.count)
+        mean, p95, maximum = profiler.getStats(EVENTS)
+        self.assertGreaterEqual(mean, 2)
+        self.assertLess(profiler.getStats(FLIP)[0], mean)
+        # skipped phases record nothing
+        self.assertEqual((0, 0, 0), profiler.getStats(DRAW))
+        self.assertLess(profiler.getTicksPerSecond(), 500)
+        # no frames were drawn
+        self.assertEqual(0, profiler.getFramesPerSecond())
+
+    def testPausedFramesAreNotCounted(self):
+        profiler = FrameProfiler(4)
+        for i in range(10):
+            profiler.beginFrame()
+            profiler.lap(EVENTS)
+        self.assertEqual(3, profiler.count)
+        profiler.pause()
+        # laps outside a frame are ignored
+        profiler.lap(DRAW)
+        profiler.beginFrame()
+        self.assertEqual(3, profiler.count)
+        self.assertEqual((0, 0, 0), profiler.getStats(DRAW))
+
+    def testOverlayShowsCacheHits(self):
+        profiler = FrameProfiler(4)
+        lines = profiler.getOverlayLines((3, 10), [("POOL", (6, 2)), ("MAPS", (0, 1))])
+        self.assertEqual(["SPRITES 3/10", "POOL 6/8", "MAPS 0/1"], lines[-3:])
+
+if __name__ == "__main__":
+    unittest.main()
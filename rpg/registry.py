@@ -2,7 +2,8 @@
 
 class RegistryHandler:
     
-    def __init__(self, registry):
+    def __init__(self, registry, saveGameWriter = None):
+        self.saveGameWriter = saveGameWriter
         self.setRegistry(registry)
 
     def setRegistry(self, registry):
@@ -15,9 +16,15 @@ class RegistryHandler:
     def registerMetadata(self, spriteMetadata):
         self.registry.registerMetadata(spriteMetadata)
         
+    def unregisterMetadata(self, uid):
+        self.registry.unregisterMetadata(uid)
+        
     def getMetadata(self, uid):
         return self.registry.getMetadata(uid)
     
+    def getMapMetadata(self, mapName):
+        return self.registry.getMapMetadata(mapName)
+    
     def coinCollected(self, coinCollectedEvent):
         self.registry.coinCollected(coinCollectedEvent)
         
@@ -32,7 +39,156 @@ class RegistryHandler:
         
     def checkpointReached(self, checkpointReachedEvent):
         self.snapshot = self.registry.checkpointReached(checkpointReachedEvent)
+        if self.saveGameWriter:
+            # the snapshot is modified if we switch to it, so save a copy
+            self.saveGameWriter.save(self.snapshot.takeSnapshot())
+            
+    """
+    Waits for any autosave in progress to complete.
+    """
+    def close(self):
+        if self.saveGameWriter:
+            self.saveGameWriter.flush()
                             
+COLON = ":"
+
+"""
+Returns the name of the map that the given sprite uid belongs to, eg. the uid
+central:coin:3 belongs to the central map.
+"""
+def getMapName(uid):
+    return uid.partition(COLON)[0]
+
+"""
+A frozen layer of sprite metadata.  Entries are indexed by map name and then by
+uid.  Layers are never modified once created, so they can be shared between any
+number of metadata stores.
+"""
+class MetadataLayer:
+    
+    def __init__(self, entries, size, parent = None):
+        self.entries = entries
+        self.size = size
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent else 1
+        
+    """
+    Returns a new layer that combines this layer with its parent.
+    """
+    def merge(self):
+        entries = dict((mapName, dict(mapEntries)) for mapName, mapEntries in self.parent.entries.items())
+        for mapName, mapEntries in self.entries.items():
+            entries.setdefault(mapName, {}).update(mapEntries)
+        size = sum(len(mapEntries) for mapEntries in entries.values())
+        return MetadataLayer(entries, size, self.parent.parent)
+    
+    def layers(self):
+        layer = self
+        while layer:
+            yield layer
+            layer = layer.parent
+
+"""
+Copy-on-write store of sprite metadata, indexed by map name and then by uid.
+New metadata is written to a private dict, while older metadata lives in a
+chain of frozen layers that is shared with any snapshots.  Taking a snapshot
+just freezes the private dict, so it does not depend on how much metadata has
+been recorded.
+
+To keep lookups cheap, a new layer is merged with the layer below for as long
+as that layer is less than twice its size.  Layers therefore at least double in
+size down the chain, so the chain stays short and large layers are rarely
+copied.
+"""
+class MetadataStore:
+    
+    def __init__(self, layer = None):
+        self.entries = {}
+        self.size = 0
+        self.layer = layer
+        
+    def __contains__(self, uid):
+        return self.get(uid) is not None
+    
+    def __getitem__(self, uid):
+        spriteMetadata = self.get(uid)
+        if spriteMetadata is None:
+            raise KeyError(uid)
+        return spriteMetadata
+    
+    def __setitem__(self, uid, spriteMetadata):
+        mapEntries = self.entries.setdefault(getMapName(uid), {})
+        if uid not in mapEntries:
+            self.size += 1
+        mapEntries[uid] = spriteMetadata
+        
+    """
+    Removes metadata that has been set since the last snapshot.  Metadata in
+    the frozen layers cannot be removed.
+    """
+    def __delitem__(self, uid):
+        mapEntries = self.entries.get(getMapName(uid))
+        if not mapEntries or uid not in mapEntries:
+            raise KeyError(uid)
+        del mapEntries[uid]
+        self.size -= 1
+        
+    def __len__(self):
+        return len(self.items())
+    
+    def get(self, uid):
+        mapName = getMapName(uid)
+        mapEntries = self.entries.get(mapName)
+        if mapEntries and uid in mapEntries:
+            return mapEntries[uid]
+        if self.layer:
+            for layer in self.layer.layers():
+                mapEntries = layer.entries.get(mapName)
+                if mapEntries and uid in mapEntries:
+                    return mapEntries[uid]
+        return None
+    
+    """
+    Returns all the metadata for the named map as a dict keyed on uid.
+    """
+    def getMapEntries(self, mapName):
+        entries = {}
+        if self.layer:
+            for layer in reversed(list(self.layer.layers())):
+                if mapName in layer.entries:
+                    entries.update(layer.entries[mapName])
+        if mapName in self.entries:
+            entries.update(self.entries[mapName])
+        return entries
+    
+    def mapNames(self):
+        mapNames = set(self.entries)
+        if self.layer:
+            for layer in self.layer.layers():
+                mapNames.update(layer.entries)
+        return mapNames
+    
+    """
+    Returns all the metadata as a list of (uid, metadata) tuples, ordered by map.
+    """
+    def items(self):
+        layers = list(self.layer.layers()) if self.layer else []
+        mapEntries = {}
+        for entries in [layer.entries for layer in reversed(layers)] + [self.entries]:
+            for mapName in entries:
+                mapEntries.setdefault(mapName, {}).update(entries[mapName])
+        return [item for mapName in sorted(mapEntries) for item in mapEntries[mapName].items()]
+    
+    def snapshot(self):
+        if self.entries:
+            layer = MetadataLayer(self.entries, self.size, self.layer)
+            while layer.parent and layer.size * 2 >= layer.parent.size:
+                layer = layer.merge()
+            self.layer = layer
+            self.entries = {}
+            self.size = 0
+        return MetadataStore(self.layer)
+
 """
 Registry class that stores the state of the game.  A save game feature could be
 implemented by serializing this class.
@@ -44,10 +200,10 @@ class Registry:
         self.mapName = mapName
         self.playerPosition = playerPosition
         self.playerLevel = playerLevel
-        # a map of sprite metadata keyed on uid
+        # a store of sprite metadata keyed on uid
         self.spriteMetadata = spriteMetadata
         if self.spriteMetadata is None: 
-            self.spriteMetadata = {}
+            self.spriteMetadata = MetadataStore()
         # counts
         self.coinCount = coinCount
         self.keyCount = keyCount
@@ -57,17 +213,29 @@ class Registry:
     def registerMetadata(self, spriteMetadata):
         self.spriteMetadata[spriteMetadata.uid] = spriteMetadata
         
+    def unregisterMetadata(self, uid):
+        del self.spriteMetadata[uid]
+        
     def getMetadata(self, uid):
         if self.checkpoint and self.checkpoint.uid == uid:
             myCheckpoint = self.checkpoint
             self.checkpoint = None
             return myCheckpoint
-        if uid in self.spriteMetadata:
-            return self.spriteMetadata[uid]
-        return None
+        return self.spriteMetadata.get(uid)
+    
+    """
+    Returns all the metadata for the named map as a dict keyed on uid.  As with
+    getMetadata, checkpoint metadata is only returned once.
+    """
+    def getMapMetadata(self, mapName):
+        mapMetadata = self.spriteMetadata.getMapEntries(mapName)
+        if self.checkpoint and getMapName(self.checkpoint.uid) == mapName:
+            mapMetadata[self.checkpoint.uid] = self.checkpoint
+            self.checkpoint = None
+        return mapMetadata
     
     def copyMetadata(self):
-        return dict((uid, self.spriteMetadata[uid]) for uid in self.spriteMetadata)
+        return self.spriteMetadata.snapshot()
             
     def takeSnapshot(self):
         return Registry(self.mapName,
@@ -0,0 +1,100 @@
+#! /usr/bin/env python
+
+import unittest
+
+from .registry import Registry, RegistryHandler, MetadataStore
+from .events import CoinMetadata, CheckpointMetadata, CoinCollectedEvent, CheckpointReachedEvent
+
+def createRegistry(coins = 0):
+    testRegistry = Registry("central", (6, 22), 2)
+    for i in range(coins):
+        testRegistry.registerMetadata(CoinMetadata("central:coin:" + str(i)))
+    return testRegistry
+
+class MetadataStoreTest(unittest.TestCase):
+
+    def testSnapshotIsIsolated(self):
+        store = MetadataStore()
+        store["a"] = CoinMetadata("a")
+        snapshot = store.snapshot()
+        store["b"] = CoinMetadata("b")
+        snapshot["c"] = CoinMetadata("c")
+        self.assertIn("a", snapshot)
+        self.assertNotIn("b", snapshot)
+        self.assertIn("c", snapshot)
+        self.assertNotIn("c", store)
+        self.assertEqual(2, len(store))
+
+    def testSnapshotSharesLayers(self):
+        store = MetadataStore()
+        store["a"] = CoinMetadata("a")
+        snapshot = store.snapshot()
+        self.assertIs(store.layer, snapshot.layer)
+        # nothing has changed, so no new layer is required
+        store.snapshot()
+        self.assertEqual(1, store.layer.depth)
+
+    def testLayersAreMerged(self):
+        store = MetadataStore()
+        for i in range(1000):
+            store[str(i)] = CoinMetadata(str(i))
+            store.snapshot()
+            # each layer is at least twice the size of the layer above it
+            self.assertLessEqual(store.layer.depth, 10)
+        for i in range(1000):
+            self.assertIn(str(i), store)
+
+    def testNewerEntriesWin(self):
+        store = MetadataStore()
+        first, second = CoinMetadata("a"), CoinMetadata("a")
+        store["a"] = first
+        store.snapshot()
+        store["a"] = second
+        self.assertIs(second, store["a"])
+        self.assertEqual([("a", second)], store.items())
+
+    def testMapEntries(self):
+        store = MetadataStore()
+        store["central:coin:0"] = CoinMetadata("central:coin:0")
+        store["east:coin:0"] = CoinMetadata("east:coin:0")
+        store.snapshot()
+        store["central:coin:1"] = CoinMetadata("central:coin:1")
+        self.assertEqual(["central:coin:0", "central:coin:1"], sorted(store.getMapEntries("central")))
+        self.assertEqual(["east:coin:0"], list(store.getMapEntries("east")))
+        self.assertEqual({}, store.getMapEntries("caves"))
+
+class RegistryTest(unittest.TestCase):
+
+    def testMapMetadataReturnsCheckpointOnce(self):
+        checkpoint = CheckpointMetadata("central:checkpoint:0", "central", (23, 21), 3, 0, 0)
+        testRegistry = Registry("central", (23, 21), 3, checkpoint = checkpoint)
+        testRegistry.registerMetadata(CoinMetadata("central:coin:0"))
+        mapMetadata = testRegistry.getMapMetadata("central")
+        self.assertIs(checkpoint, mapMetadata["central:checkpoint:0"])
+        self.assertIn("central:coin:0", mapMetadata)
+        self.assertNotIn("central:checkpoint:0", testRegistry.getMapMetadata("central"))
+
+class RegistryHandlerTest(unittest.TestCase):
+
+    def testSwitchToSnapshotDiscardsChanges(self):
+        handler = RegistryHandler(createRegistry(10))
+        handler.coinCollected(CoinCollectedEvent(CoinMetadata("central:coin:99")))
+        self.assertIsNotNone(handler.getMetadata("central:coin:99"))
+        handler.switchToSnapshot()
+        self.assertIsNone(handler.getMetadata("central:coin:99"))
+        self.assertIsNotNone(handler.getMetadata("central:coin:9"))
+
+    def testCheckpointKeepsChanges(self):
+        handler = RegistryHandler(createRegistry(10))
+        handler.coinCollected(CoinCollectedEvent(CoinMetadata("central:coin:99")))
+        checkpoint = CheckpointMetadata("central:checkpoint:0", "central", (23, 21), 3, 11, 0)
+        handler.checkpointReached(CheckpointReachedEvent(checkpoint))
+        handler.coinCollected(CoinCollectedEvent(CoinMetadata("central:coin:100")))
+        handler.switchToSnapshot()
+        self.assertIsNotNone(handler.getMetadata("central:coin:99"))
+        self.assertIsNone(handler.getMetadata("central:coin:100"))
+        self.assertEqual((23, 21), handler.registry.playerPosition)
+        self.assertEqual(11, handler.registry.coinCount)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+import zlib
+import struct
+
+from pygame.locals import K_UP, K_DOWN, K_LEFT, K_RIGHT, K_SPACE, K_BACKSPACE
+from . import savegame
+
+"""
+Records the keys pressed on every tick of a game so that it can be replayed
+exactly - the game has no other inputs, so the same keys from the same starting
+registry always play out the same way.  Replays are saved in a compact binary
+format.  All values are little-endian:
+
+header      magic (4s) version (H)
+registry    length (I), then the starting registry in the save game format
+runs        count (I), then for each run: frames (I) + key mask (B)
+final       player x (i) y (i) level (f) + checksum of the final state (I)
+
+Consecutive ticks with the same keys are stored as a single run.  The final
+state lets a replay check that it ended up where the recording did.
+"""
+
+REPLAY_FILE = "ulmo.rec"
+
+MAGIC = b"ULRP"
+VERSION = 1
+
+HEADER = struct.Struct("<4sH")
+COUNT = struct.Struct("<I")
+RUN_RECORD = struct.Struct("<IB")
+FINAL_RECORD = struct.Struct("<iifI")
+
+# the keys that affect play, in key mask bit order
+RECORDED_KEYS = [K_UP, K_DOWN, K_LEFT, K_RIGHT, K_SPACE, K_BACKSPACE]
+
+def getKeyMask(keyPresses):
+    keyMask = 0
+    for i, key in enumerate(RECORDED_KEYS):
+        if keyPresses[key]:
+            keyMask |= 1 << i
+    return keyMask
+
+def getKeys(keyMask):
+    return [key for i, key in enumerate(RECORDED_KEYS) if keyMask & (1 << i)]
+
+"""
+Returns the final player position + a checksum of the player and registry.
+"""
+def getFinalState(player, registry):
+    x, y = player.mapRect.topleft
+    state = repr((player.rpgMap.name, x, y, player.level, player.getCoinCount(), player.getKeyCount()))
+    checksum = zlib.crc32(savegame.encodeRegistry(registry), zlib.crc32(state.encode()))
+    return x, y, player.level, checksum
+
+"""
+Records key presses from the start of a game.
+"""
+class InputRecorder:
+
+    def __init__(self, registry):
+        # encoded straight away, as the registry may be modified during play
+        self.registryData = savegame.encodeRegistry(registry)
+        # [frames, key mask] lists
+        self.runs = []
+
+    def record(self, keyPresses):
+        keyMask = getKeyMask(keyPresses)
+        if self.runs and self.runs[-1][1] == keyMask:
+            self.runs[-1][0] += 1
+        else:
+            self.runs.append([1, keyMask])
+
+    def getFrameCount(self):
+        return sum(frames for frames, keyMask in self.runs)
+
+    def encode(self, player, registry):
+        chunks = [HEADER.pack(MAGIC, VERSION),
+                  COUNT.pack(len(self.registryData)),
+                  self.registryData,
+                  COUNT.pack(len(self.runs))]
+        chunks += [RUN_RECORD.pack(frames, keyMask) for frames, keyMask in self.runs]
+        chunks.append(FINAL_RECORD.pack(*getFinalState(player, registry)))
+        return b"".join(chunks)
+
+    """
+    Saves the recording along with the final state of the given player and
+    registry.
+    """
+    def save(self, player, registry, path = REPLAY_FILE):
+        with open(path, "wb") as replayFile:
+            replayFile.write(self.encode(player, registry))
+        print("recorded %d frames: %s" % (self.getFrameCount(), path))
+
+"""
+A recording loaded for replay.
+"""
+class Replay:
+
+    def __init__(self, registry, runs, finalState):
+        self.registry = registry
+        self.runs = runs
+        self.finalState = finalState
+        self.frameCount = sum(frames for frames, keyMask in runs)
+
+    """
+    Returns the recorded key presses as a script for gameloop.ScriptedInput.
+    """
+    def getScript(self):
+        return [(frames, getKeys(keyMask)) for frames, keyMask in self.runs]
+
+    """
+    Returns True if the given player + registry match the final state of the
+    recording.
+    """
+    def verify(self, player, registry):
+        # packed so that the level is compared at the same precision
+        finalState = FINAL_RECORD.unpack(FINAL_RECORD.pack(*getFinalState(player, registry)))
+        return finalState == self.finalState
+
+def decodeReplay(data):
+    magic, version = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a replay")
+    if version != VERSION:
+        raise ValueError("unsupported replay version: %d" % version)
+    offset = HEADER.size
+    length, = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    registry = savegame.decodeRegistry(data[offset:offset + length])
+    offset += length
+    count, = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    runs = list(RUN_RECORD.iter_unpack(data[offset:offset + count * RUN_RECORD.size]))
+    offset += count * RUN_RECORD.size
+    return Replay(registry, runs, FINAL_RECORD.unpack_from(data, offset))
+
+def loadReplay(path = REPLAY_FILE):
+    with open(path, "rb") as replayFile:
+        return decodeReplay(replayFile.read())
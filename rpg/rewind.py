@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+from array import array
+from .view import FRAMES_PER_SEC
+
+"""
+Rewind support.  While the game is played a rewind buffer records, for every
+tick, what is needed to undo that tick: the previous player state, the previous
+state of any sprites that moved or were removed, and any metadata added to the
+registry.  Holding the rewind key then steps backwards through the buffer one
+tick at a time.
+
+Only changes are recorded for the sprites - most are static, so a typical tick
+records just the player plus a few moving sprites.  All the storage is
+preallocated, so the memory used is fixed no matter how long the game is
+played.  Once the buffer is full the oldest ticks are dropped.
+
+Some actions are not worth undoing, eg. opening a door changes the map itself.
+These act as a barrier - the buffer is cleared so it is not possible to rewind
+past them.  The buffer is also cleared whenever a new play state begins.
+"""
+
+REWIND_SECONDS = 10
+REWIND_TICKS = REWIND_SECONDS * FRAMES_PER_SEC
+
+# the average number of sprite records per tick the buffer is sized for
+SPRITE_RECORDS_PER_TICK = 8
+
+# x, y, frameCount, frameIndex, direction, coinCount, keyCount
+PLAYER_FIELDS = 7
+# uid index, then x, y, extra, frameCount, frameIndex, direction
+SPRITE_FIELDS = 7
+
+# no registry change for a tick
+NO_CHANGE = -1
+
+"""
+Preallocated ring buffer of tick records.  Sprite records for each tick are
+stored contiguously in a second ring that is shared by all the ticks.
+"""
+class RewindBuffer:
+
+    def __init__(self, capacity = REWIND_TICKS, spriteCapacity = None):
+        self.capacity = capacity
+        self.spriteCapacity = spriteCapacity or capacity * SPRITE_RECORDS_PER_TICK
+        # tick records
+        self.playerStates = array("i", [0]) * (capacity * PLAYER_FIELDS)
+        self.playerLevels = array("d", [0]) * capacity
+        self.registryChanges = array("i", [NO_CHANGE]) * capacity
+        self.spriteStarts = array("I", [0]) * capacity
+        self.spriteCounts = array("I", [0]) * capacity
+        # sprite records
+        self.spriteStates = array("i", [0]) * (self.spriteCapacity * SPRITE_FIELDS)
+        self.clear()
+
+    def clear(self):
+        self.first = 0
+        self.count = 0
+        self.spriteFirst = 0
+        self.spriteCount = 0
+        self.tick = None
+
+    def __len__(self):
+        return self.count
+
+    """
+    Begins a new tick record.  The oldest tick is dropped if the buffer is full.
+    """
+    def addTick(self, playerState, level, registryChange = NO_CHANGE):
+        if self.count == self.capacity:
+            self.dropOldestTick()
+        tick = (self.first + self.count) % self.capacity
+        self.count += 1
+        offset = tick * PLAYER_FIELDS
+        playerStates = self.playerStates
+        for value in playerState:
+            playerStates[offset] = value
+            offset += 1
+        self.playerLevels[tick] = level
+        self.registryChanges[tick] = registryChange
+        self.spriteStarts[tick] = (self.spriteFirst + self.spriteCount) % self.spriteCapacity
+        self.spriteCounts[tick] = 0
+        self.tick = tick
+
+    """
+    Adds a sprite record to the current tick.  Older ticks are dropped to make
+    room if required - returns False if there is still no room.
+    """
+    def addSprite(self, uidIndex, spriteState):
+        while self.spriteCount == self.spriteCapacity:
+            if self.count == 1:
+                return False
+            self.dropOldestTick()
+        offset = ((self.spriteFirst + self.spriteCount) % self.spriteCapacity) * SPRITE_FIELDS
+        spriteStates = self.spriteStates
+        spriteStates[offset] = uidIndex
+        for value in spriteState:
+            offset += 1
+            spriteStates[offset] = value
+        self.spriteCount += 1
+        self.spriteCounts[self.tick] += 1
+        return True
+
+    def dropOldestTick(self):
+        spriteCount = self.spriteCounts[self.first]
+        self.spriteFirst = (self.spriteFirst + spriteCount) % self.spriteCapacity
+        self.spriteCount -= spriteCount
+        self.first = (self.first + 1) % self.capacity
+        self.count -= 1
+
+    """
+    Removes the newest tick and returns its index, or None if the buffer is
+    empty.  The tick can be read until the next tick is added.
+    """
+    def popTick(self):
+        if self.count == 0:
+            return None
+        self.count -= 1
+        tick = (self.first + self.count) % self.capacity
+        self.spriteCount -= self.spriteCounts[tick]
+        self.tick = (tick - 1) % self.capacity if self.count else None
+        return tick
+
+    def getPlayerState(self, tick):
+        offset = tick * PLAYER_FIELDS
+        return tuple(self.playerStates[offset:offset + PLAYER_FIELDS]), self.playerLevels[tick]
+
+    """
+    Returns the sprite records for the given tick as (uid index, state) tuples.
+    """
+    def getSprites(self, tick):
+        sprites = []
+        index = self.spriteStarts[tick]
+        for i in range(self.spriteCounts[tick]):
+            offset = index * SPRITE_FIELDS
+            sprites.append((self.spriteStates[offset], tuple(self.spriteStates[offset + 1:offset + SPRITE_FIELDS])))
+            index = (index + 1) % self.spriteCapacity
+        return sprites
+
+    def getMemorySize(self):
+        return sum(a.itemsize * len(a) for a in (self.playerStates,
+                                                 self.playerLevels,
+                                                 self.registryChanges,
+                                                 self.spriteStarts,
+                                                 self.spriteCounts,
+                                                 self.spriteStates))
+
+"""
+Captures the game state into a rewind buffer and restores it again.  This
+listens for the events that change the registry or act as a barrier.
+"""
+class Rewinder:
+
+    def __init__(self, registryHandler, buffer = None):
+        self.registryHandler = registryHandler
+        self.buffer = buffer if buffer is not None else RewindBuffer()
+        self.player = None
+        self.spriteLoader = None
+
+    """
+    Starts recording for a new play state.
+    """
+    def start(self, player, spriteLoader):
+        self.player = player
+        self.spriteLoader = spriteLoader
+        # uids are stored in the buffer as indexes into this list
+        self.uids = []
+        self.uidIndexes = {}
+        self.clear()
+
+    def clear(self):
+        self.buffer.clear()
+        self.lastPlayerState = None
+        self.lastSpriteStates = {}
+        self.registryChange = NO_CHANGE
+
+    def getUidIndex(self, uid):
+        uidIndex = self.uidIndexes.get(uid)
+        if uidIndex is None:
+            uidIndex = self.uidIndexes[uid] = len(self.uids)
+            self.uids.append(uid)
+        return uidIndex
+
+    """
+    Called at the end of each tick of play to record how to undo it.
+    """
+    def capture(self):
+        if self.player.falling:
+            return
+        spriteStates = {}
+        for sprite in self.spriteLoader.loadedSprites:
+            if sprite.alive():
+                spriteStates[sprite.uid] = sprite.getRewindState()
+        playerState = self.player.getRewindState()
+        if self.lastPlayerState:
+            self.buffer.addTick(*self.lastPlayerState, registryChange = self.registryChange)
+            lastSpriteStates = self.lastSpriteStates
+            for uid, lastState in lastSpriteStates.items():
+                spriteState = spriteStates.get(uid)
+                # animation alone does not need to be undone
+                if (spriteState is None
+                    or spriteState[0] != lastState[0]
+                    or spriteState[1] != lastState[1]
+                    or spriteState[2] != lastState[2]):
+                    if not self.buffer.addSprite(self.getUidIndex(uid), lastState):
+                        self.clear()
+                        break
+        self.lastPlayerState = playerState
+        self.lastSpriteStates = spriteStates
+        self.registryChange = NO_CHANGE
+
+    """
+    Undoes the most recent tick.  Returns False if there is nothing to undo.
+    """
+    def rewind(self):
+        tick = self.buffer.popTick()
+        if tick is None:
+            return False
+        playerState, level = self.buffer.getPlayerState(tick)
+        self.player.setRewindState(*playerState, level = level)
+        self.lastPlayerState = playerState, level
+        registryChange = self.buffer.registryChanges[tick]
+        if registryChange != NO_CHANGE:
+            self.registryHandler.unregisterMetadata(self.uids[registryChange])
+        records = self.buffer.getSprites(tick)
+        if records:
+            sprites = dict((sprite.uid, sprite) for sprite in self.spriteLoader.loadedSprites if sprite.alive())
+            for uidIndex, spriteState in records:
+                uid = self.uids[uidIndex]
+                sprite = sprites.get(uid) or self.spriteLoader.restoreSprite(uid)
+                if sprite:
+                    sprite.setRewindState(*spriteState)
+                    self.lastSpriteStates[uid] = spriteState
+        return True
+
+    # ==========================================================================
+
+    def recordRegistryChange(self, uid):
+        if self.registryChange != NO_CHANGE:
+            # only one change is recorded per tick
+            self.clear()
+            return
+        self.registryChange = self.getUidIndex(uid)
+
+    def coinCollected(self, coinCollectedEvent):
+        self.recordRegistryChange(coinCollectedEvent.getMetadata().uid)
+
+    def keyCollected(self, keyCollectedEvent):
+        self.recordRegistryChange(keyCollectedEvent.getMetadata().uid)
+
+    def doorOpening(self, doorOpeningEvent):
+        self.clear()
+
+    def doorOpened(self, doorOpenedEvent):
+        self.clear()
+
+    def checkpointReached(self, checkpointReachedEvent):
+        self.clear()
+
+    def playerFalling(self, playerFallingEvent):
+        self.clear()
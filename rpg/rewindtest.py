@@ -0,0 +1,54 @@
+#! /usr/bin/env python
+
+import unittest
+
+from .rewind import RewindBuffer, NO_CHANGE
+
+PLAYER_STATE = (10, 20, 0, 1, 2, 3, 0)
+
+def spriteState(x):
+    return (x, 0, 0, 0, 0, 2)
+
+class RewindBufferTest(unittest.TestCase):
+
+    def testPopReturnsNewestTick(self):
+        buffer = RewindBuffer(4)
+        buffer.addTick(PLAYER_STATE, 2)
+        buffer.addTick((11,) + PLAYER_STATE[1:], 1.5, 7)
+        buffer.addSprite(3, spriteState(40))
+        tick = buffer.popTick()
+        self.assertEqual(((11,) + PLAYER_STATE[1:], 1.5), buffer.getPlayerState(tick))
+        self.assertEqual(7, buffer.registryChanges[tick])
+        self.assertEqual([(3, spriteState(40))], buffer.getSprites(tick))
+        tick = buffer.popTick()
+        self.assertEqual((PLAYER_STATE, 2), buffer.getPlayerState(tick))
+        self.assertEqual(NO_CHANGE, buffer.registryChanges[tick])
+        self.assertEqual([], buffer.getSprites(tick))
+        self.assertIsNone(buffer.popTick())
+
+    def testOldestTicksAreDropped(self):
+        buffer = RewindBuffer(4)
+        for i in range(10):
+            buffer.addTick((i,) + PLAYER_STATE[1:], 1)
+        self.assertEqual(4, len(buffer))
+        ticks = [buffer.getPlayerState(buffer.popTick())[0][0] for i in range(4)]
+        self.assertEqual([9, 8, 7, 6], ticks)
+
+    def testSpriteRecordsWrap(self):
+        buffer = RewindBuffer(4, 5)
+        for i in range(10):
+            buffer.addTick(PLAYER_STATE, 1)
+            self.assertTrue(buffer.addSprite(i, spriteState(i)))
+            self.assertTrue(buffer.addSprite(i, spriteState(i + 100)))
+        # only two ticks fit in the sprite records
+        self.assertEqual(2, len(buffer))
+        self.assertEqual([(9, spriteState(9)), (9, spriteState(109))], buffer.getSprites(buffer.popTick()))
+        self.assertEqual([(8, spriteState(8)), (8, spriteState(108))], buffer.getSprites(buffer.popTick()))
+        # a single tick that doesn't fit
+        buffer.addTick(PLAYER_STATE, 1)
+        for i in range(5):
+            self.assertTrue(buffer.addSprite(i, spriteState(i)))
+        self.assertFalse(buffer.addSprite(5, spriteState(5)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+
+import os
+import time
+import struct
+import threading
+
+from .registry import Registry, MetadataStore, MetadataLayer, getMapName
+from .events import CoinMetadata, KeyMetadata, DoorMetadata, CheckpointMetadata
+
+"""
+Compact binary save game format for the Registry.  All values are little-endian:
+
+header      magic (4s) version (H)
+strings     count (I), then for each string: length (H) + utf-8 bytes
+registry    map name (I) x (i) y (i) level (f) coins (I) keys (I) checkpoint flag (B)
+checkpoint  present only if the checkpoint flag is set - see CHECKPOINT_RECORD
+metadata    for each metadata type in turn: count (I) + fixed size records
+
+Strings are stored once and referred to by index.  A uid such as central:coin:3
+is split into a prefix (central:coin) and a number (3) so that uids sharing a
+prefix only store the number.
+"""
+
+SAVE_FILE = "ulmo.sav"
+
+MAGIC = b"ULMO"
+VERSION = 1
+
+# used in place of the uid number when a uid doesn't end in one
+NO_NUMBER = 0xFFFFFFFF
+
+HEADER = struct.Struct("<4sH")
+COUNT = struct.Struct("<I")
+STRING_LENGTH = struct.Struct("<H")
+REGISTRY_RECORD = struct.Struct("<IiifIIB")
+
+# metadata records - each starts with the uid prefix + number
+UID_RECORD = struct.Struct("<II")
+DOOR_RECORD = struct.Struct("<IIiif")
+CHECKPOINT_RECORD = struct.Struct("<IIIiifII")
+
+"""
+Builds up the string table while encoding.
+"""
+class StringTable:
+
+    def __init__(self):
+        self.indices = {}
+        self.strings = []
+
+    def getIndex(self, string):
+        if string not in self.indices:
+            self.indices[string] = len(self.strings)
+            self.strings.append(string)
+        return self.indices[string]
+
+    def getUidIndex(self, uid):
+        prefix, colon, number = uid.rpartition(":")
+        if prefix and number.isdigit():
+            return self.getIndex(prefix), int(number)
+        return self.getIndex(uid), NO_NUMBER
+
+    def encode(self):
+        chunks = [COUNT.pack(len(self.strings))]
+        for string in self.strings:
+            encoded = string.encode("utf-8")
+            chunks.append(STRING_LENGTH.pack(len(encoded)))
+            chunks.append(encoded)
+        return b"".join(chunks)
+
+def encodeLevel(level):
+    return float(level)
+
+def decodeLevel(level):
+    # levels are whole numbers unless the sprite is on some steps
+    return int(level) if level == int(level) else level
+
+def decodeUid(strings, prefixIndex, number):
+    if number == NO_NUMBER:
+        return strings[prefixIndex]
+    return strings[prefixIndex] + ":" + str(number)
+
+# ==============================================================================
+
+def encodeUidMetadata(strings, spriteMetadata):
+    return UID_RECORD.pack(*strings.getUidIndex(spriteMetadata.uid))
+
+def encodeDoorMetadata(strings, doorMetadata):
+    prefixIndex, number = strings.getUidIndex(doorMetadata.uid)
+    return DOOR_RECORD.pack(prefixIndex, number,
+                            doorMetadata.x, doorMetadata.y,
+                            encodeLevel(doorMetadata.level))
+
+def encodeCheckpointMetadata(strings, checkpoint):
+    prefixIndex, number = strings.getUidIndex(checkpoint.uid)
+    return CHECKPOINT_RECORD.pack(prefixIndex, number,
+                                  strings.getIndex(checkpoint.mapName),
+                                  checkpoint.tilePosition[0],
+                                  checkpoint.tilePosition[1],
+                                  encodeLevel(checkpoint.level),
+                                  checkpoint.coinCount,
+                                  checkpoint.keyCount)
+
+def decodeCoinMetadata(strings, prefixIndex, number):
+    return CoinMetadata(decodeUid(strings, prefixIndex, number))
+
+def decodeKeyMetadata(strings, prefixIndex, number):
+    return KeyMetadata(decodeUid(strings, prefixIndex, number))
+
+def decodeDoorMetadata(strings, prefixIndex, number, x, y, level):
+    return DoorMetadata(decodeUid(strings, prefixIndex, number), (x, y), decodeLevel(level))
+
+def decodeCheckpointMetadata(strings, prefixIndex, number, mapIndex, x, y, level, coinCount, keyCount):
+    return CheckpointMetadata(decodeUid(strings, prefixIndex, number),
+                              strings[mapIndex],
+                              (x, y),
+                              decodeLevel(level),
+                              coinCount,
+                              keyCount)
+
+"""
+Metadata types in the order they are saved, as tuples of the metadata class,
+the record struct and the encode + decode functions.  New types must be added
+to the end of this list and VERSION incremented.
+"""
+METADATA_TYPES = [(CoinMetadata, UID_RECORD, encodeUidMetadata, decodeCoinMetadata),
+                  (KeyMetadata, UID_RECORD, encodeUidMetadata, decodeKeyMetadata),
+                  (DoorMetadata, DOOR_RECORD, encodeDoorMetadata, decodeDoorMetadata),
+                  (CheckpointMetadata, CHECKPOINT_RECORD, encodeCheckpointMetadata, decodeCheckpointMetadata)]
+
+# ==============================================================================
+
+"""
+Returns the given registry encoded as bytes.
+"""
+def encodeRegistry(registry):
+    strings = StringTable()
+    # group the metadata by type
+    records = dict((metadataType[0], []) for metadataType in METADATA_TYPES)
+    for uid, spriteMetadata in registry.spriteMetadata.items():
+        metadataClass = spriteMetadata.__class__
+        if metadataClass not in records:
+            raise ValueError("cannot save metadata: %s" % metadataClass.__name__)
+        records[metadataClass].append(spriteMetadata)
+    # registry fields
+    chunks = [REGISTRY_RECORD.pack(strings.getIndex(registry.mapName),
+                                   registry.playerPosition[0],
+                                   registry.playerPosition[1],
+                                   encodeLevel(registry.playerLevel),
+                                   registry.coinCount,
+                                   registry.keyCount,
+                                   1 if registry.checkpoint else 0)]
+    if registry.checkpoint:
+        chunks.append(encodeCheckpointMetadata(strings, registry.checkpoint))
+    # metadata
+    for metadataClass, record, encode, decode in METADATA_TYPES:
+        metadataList = records[metadataClass]
+        chunks.append(COUNT.pack(len(metadataList)))
+        chunks += [encode(strings, spriteMetadata) for spriteMetadata in metadataList]
+    return HEADER.pack(MAGIC, VERSION) + strings.encode() + b"".join(chunks)
+
+"""
+Returns a new registry decoded from the given bytes.  Raises ValueError if the
+bytes are not a save game, eg. a truncated or corrupt file.
+"""
+def decodeRegistry(data):
+    try:
+        return unpackRegistry(data)
+    except (struct.error, IndexError) as e:
+        raise ValueError("corrupt save: %s" % e)
+
+def unpackRegistry(data):
+    magic, version = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a save game")
+    if version != VERSION:
+        raise ValueError("unsupported save game version: %s" % version)
+    offset = HEADER.size
+    # strings
+    stringCount, = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    strings = []
+    for i in range(stringCount):
+        length, = STRING_LENGTH.unpack_from(data, offset)
+        offset += STRING_LENGTH.size
+        strings.append(data[offset:offset + length].decode("utf-8"))
+        offset += length
+    # registry fields
+    mapIndex, x, y, level, coinCount, keyCount, hasCheckpoint = REGISTRY_RECORD.unpack_from(data, offset)
+    offset += REGISTRY_RECORD.size
+    checkpoint = None
+    if hasCheckpoint:
+        checkpoint = decodeCheckpointMetadata(strings, *CHECKPOINT_RECORD.unpack_from(data, offset))
+        offset += CHECKPOINT_RECORD.size
+    # metadata - this goes straight into a frozen layer indexed on map name
+    mapNames = [getMapName(string) for string in strings]
+    entries = {}
+    size = 0
+    for metadataClass, record, encode, decode in METADATA_TYPES:
+        count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        end = offset + count * record.size
+        for fields in record.iter_unpack(data[offset:end]):
+            spriteMetadata = decode(strings, *fields)
+            mapEntries = entries.get(mapNames[fields[0]])
+            if mapEntries is None:
+                mapEntries = entries[mapNames[fields[0]]] = {}
+            mapEntries[spriteMetadata.uid] = spriteMetadata
+        size += count
+        offset = end
+    spriteMetadata = MetadataStore(MetadataLayer(entries, size) if size else None)
+    return Registry(strings[mapIndex], (x, y), decodeLevel(level),
+                    coinCount, keyCount, spriteMetadata, checkpoint)
+
+def saveRegistry(registry, path = SAVE_FILE):
+    with open(path, "wb") as saveFile:
+        saveFile.write(encodeRegistry(registry))
+
+def loadRegistry(path = SAVE_FILE):
+    with open(path, "rb") as saveFile:
+        return decodeRegistry(saveFile.read())
+
+"""
+Saves registries on a background thread, so the game never waits on the disk.
+Only the latest registry is kept while a save is in progress - any older one
+still waiting to be written is superseded.  Each save is written to a
+temporary file that is then renamed over the save file, so a crash mid-save
+leaves the previous save intact.  Registries passed to save must not be
+modified afterwards, eg. use Registry.takeSnapshot.
+"""
+class SaveGameWriter:
+
+    def __init__(self, path = SAVE_FILE):
+        self.path = path
+        self.condition = threading.Condition()
+        self.pending = None
+        self.busy = False
+        self.thread = None
+        # instrumentation
+        self.saveCount = 0
+        self.supersededCount = 0
+        self.errorCount = 0
+        self.lastSaveTime = 0
+        self.maxSaveTime = 0
+        self.totalSaveTime = 0
+
+    def save(self, registry):
+        with self.condition:
+            if self.pending:
+                self.supersededCount += 1
+            self.pending = registry
+            if not self.thread:
+                self.thread = threading.Thread(target = self.run, name = "SaveGameWriter")
+                self.thread.daemon = True
+                self.thread.start()
+            self.condition.notify()
+
+    """
+    Waits until any pending save has been written.
+    """
+    def flush(self):
+        with self.condition:
+            while self.pending or self.busy:
+                self.condition.wait()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                registry, self.pending = self.pending, None
+                self.busy = True
+            start = time.perf_counter()
+            saved = False
+            try:
+                self.write(registry)
+                saved = True
+            except Exception as e:
+                # eg. a disk error or a registry that can't be encoded - the
+                # writer must keep running for the next save
+                print("save failed: %s" % e)
+            finally:
+                saveTime = time.perf_counter() - start
+                with self.condition:
+                    if saved:
+                        self.saveCount += 1
+                        self.lastSaveTime = saveTime
+                        self.maxSaveTime = max(self.maxSaveTime, saveTime)
+                        self.totalSaveTime += saveTime
+                    else:
+                        self.errorCount += 1
+                    self.busy = False
+                    self.condition.notify_all()
+
+    def write(self, registry):
+        data = encodeRegistry(registry)
+        tempPath = self.path + ".tmp"
+        with open(tempPath, "wb") as saveFile:
+            saveFile.write(data)
+            saveFile.flush()
+            os.fsync(saveFile.fileno())
+        os.replace(tempPath, self.path)
+
+    def getAverageSaveTime(self):
+        return self.totalSaveTime / self.saveCount if self.saveCount else 0
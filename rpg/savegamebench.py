@@ -0,0 +1,63 @@
+#! /usr/bin/env python
+
+import os
+import sys
+import time
+import tempfile
+
+from . import savegame
+
+from .registry import Registry
+from .events import CoinMetadata, KeyMetadata, DoorMetadata, CheckpointMetadata
+
+"""
+Times save + load of a synthetic registry.  Run with:
+
+python -m rpg.savegamebench [entries]
+"""
+
+MAP_COUNT = 200
+RUNS = 5
+
+def createRegistry(entryCount):
+    registry = Registry("central", (6, 22), 2, 40, 2)
+    for i in range(entryCount):
+        mapName = "map%s" % (i % MAP_COUNT)
+        kind = i % 10
+        if kind < 7:
+            registry.registerMetadata(CoinMetadata("%s:coin:%s" % (mapName, i)))
+        elif kind < 9:
+            registry.registerMetadata(KeyMetadata("%s:key:%s" % (mapName, i)))
+        else:
+            registry.registerMetadata(DoorMetadata("%s:door:%s" % (mapName, i), (i % 32, i % 16), 2))
+        # take the odd snapshot so the metadata is spread over several layers
+        if i % 10000 == 0:
+            registry = registry.takeSnapshot()
+    registry.checkpoint = CheckpointMetadata("central:checkpoint:0", "central", (23, 21), 3, 40, 2)
+    return registry
+
+def timeRuns(function):
+    times = []
+    for i in range(RUNS):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main(entryCount):
+    registry = createRegistry(entryCount)
+    handle, path = tempfile.mkstemp()
+    os.close(handle)
+    try:
+        saveTime = timeRuns(lambda: savegame.saveRegistry(registry, path))
+        loadTime = timeRuns(lambda: savegame.loadRegistry(path))
+        fileSize = os.path.getsize(path)
+    finally:
+        os.remove(path)
+    print("entries: %s" % entryCount)
+    print("file size: %.1f KiB (%.1f bytes/entry)" % (fileSize / 1024, fileSize / max(1, entryCount)))
+    print("save: %.1f ms" % (saveTime * 1000))
+    print("load: %.1f ms" % (loadTime * 1000))
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
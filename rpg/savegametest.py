@@ -0,0 +1,126 @@
+#! /usr/bin/env python
+
+import os
+import tempfile
+import unittest
+
+from . import savegame
+
+from .registry import Registry, RegistryHandler
+from .events import SpriteMetadata, CoinMetadata, KeyMetadata, DoorMetadata, CheckpointMetadata, CheckpointReachedEvent
+
+def createRegistry():
+    checkpoint = CheckpointMetadata("central:checkpoint:1", "central", (4, 8), 4, 3, 1)
+    registry = Registry("east", (10, 18), 1.5, 3, 1, checkpoint = checkpoint)
+    registry.registerMetadata(CoinMetadata("central:coin:0"))
+    registry.registerMetadata(CoinMetadata("east:coin:2"))
+    registry.registerMetadata(KeyMetadata("wasps:key:0"))
+    registry.registerMetadata(DoorMetadata("central:door:0", (6, 2), 4))
+    registry.registerMetadata(CheckpointMetadata("central:checkpoint:0", "central", (23, 21), 3, 2, 0))
+    registry.registerMetadata(CoinMetadata("odd-uid"))
+    return registry
+
+class SaveGameTest(unittest.TestCase):
+
+    def assertMetadataEqual(self, expected, actual):
+        self.assertIs(expected.__class__, actual.__class__)
+        self.assertEqual(vars(expected), vars(actual))
+
+    def assertRegistryEqual(self, expected, actual):
+        self.assertEqual(expected.mapName, actual.mapName)
+        self.assertEqual(tuple(expected.playerPosition), tuple(actual.playerPosition))
+        self.assertEqual(expected.playerLevel, actual.playerLevel)
+        self.assertEqual(expected.coinCount, actual.coinCount)
+        self.assertEqual(expected.keyCount, actual.keyCount)
+        self.assertMetadataEqual(expected.checkpoint, actual.checkpoint)
+        expectedItems = expected.spriteMetadata.items()
+        actualItems = actual.spriteMetadata.items()
+        self.assertEqual([uid for uid, m in expectedItems], [uid for uid, m in actualItems])
+        for (uid, expectedMetadata), (uid, actualMetadata) in zip(expectedItems, actualItems):
+            self.assertMetadataEqual(expectedMetadata, actualMetadata)
+
+    def testRoundTrip(self):
+        registry = createRegistry()
+        loaded = savegame.decodeRegistry(savegame.encodeRegistry(registry))
+        self.assertRegistryEqual(registry, loaded)
+        self.assertIsInstance(loaded.spriteMetadata["central:door:0"].level, int)
+
+    def testRoundTripWithoutCheckpoint(self):
+        registry = Registry("central", (6, 22), 2)
+        loaded = savegame.decodeRegistry(savegame.encodeRegistry(registry))
+        self.assertIsNone(loaded.checkpoint)
+        self.assertEqual(0, len(loaded.spriteMetadata))
+
+    def testSaveAndLoad(self):
+        registry = createRegistry()
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            savegame.saveRegistry(registry, path)
+            self.assertRegistryEqual(registry, savegame.loadRegistry(path))
+        finally:
+            os.remove(path)
+
+    def testUnknownMetadata(self):
+        registry = Registry("central", (6, 22), 2)
+        registry.registerMetadata(SpriteMetadata("central:thing:0"))
+        self.assertRaises(ValueError, savegame.encodeRegistry, registry)
+
+    def testBadData(self):
+        self.assertRaises(ValueError, savegame.decodeRegistry, b"NOPE\x01\x00")
+
+    def testTruncatedData(self):
+        data = savegame.encodeRegistry(createRegistry())
+        for length in (0, 3, 10, len(data) // 2, len(data) - 1):
+            self.assertRaises(ValueError, savegame.decodeRegistry, data[:length])
+
+class SaveGameWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "test.sav")
+
+    def tearDown(self):
+        for fileName in os.listdir(self.folder):
+            os.remove(os.path.join(self.folder, fileName))
+        os.rmdir(self.folder)
+
+    def testLatestSaveWins(self):
+        writer = savegame.SaveGameWriter(self.path)
+        for i in range(20):
+            writer.save(Registry("central", (i, 22), 2))
+        writer.flush()
+        self.assertEqual((19, 22), savegame.loadRegistry(self.path).playerPosition)
+        self.assertEqual(20, writer.saveCount + writer.supersededCount)
+        # only the save file is left behind
+        self.assertEqual(["test.sav"], os.listdir(self.folder))
+
+    def testFailedSave(self):
+        writer = savegame.SaveGameWriter(self.path)
+        # a negative coin count can't be encoded
+        writer.save(Registry("central", (6, 22), 2, -1))
+        writer.flush()
+        self.assertEqual((0, 1), (writer.saveCount, writer.errorCount))
+        # the writer carries on with the next save
+        writer.save(Registry("central", (7, 22), 2))
+        writer.flush()
+        self.assertEqual((7, 22), savegame.loadRegistry(self.path).playerPosition)
+        self.assertEqual((1, 1), (writer.saveCount, writer.errorCount))
+
+    def testCheckpointIsSaved(self):
+        writer = savegame.SaveGameWriter(self.path)
+        handler = RegistryHandler(Registry("central", (6, 22), 2), writer)
+        handler.registerMetadata(CoinMetadata("central:coin:0"))
+        checkpoint = CheckpointMetadata("central:checkpoint:0", "central", (23, 21), 3, 1, 0)
+        handler.checkpointReached(CheckpointReachedEvent(checkpoint))
+        # changes to the live registry are not saved
+        handler.registerMetadata(CoinMetadata("central:coin:1"))
+        handler.close()
+        loaded = savegame.loadRegistry(self.path)
+        self.assertEqual((23, 21), loaded.playerPosition)
+        self.assertIn("central:coin:0", loaded.spriteMetadata)
+        self.assertNotIn("central:coin:1", loaded.spriteMetadata)
+        self.assertEqual(1, writer.saveCount)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,106 +1,421 @@
 #!/usr/bin/env python
 
 import os
+import math
+import time
+import threading
 import pygame
 
 SOUNDS_FOLDER = "sounds"
+MUSIC_FOLDER = "music"
 
-BEETLE_SOUND_TICKS = 15
+MUSIC_VOLUME = 0.5
+MUSIC_FADE_MILLIS = 1000
 
-def getSound(name, volume):
-    soundPath = os.path.join(SOUNDS_FOLDER, name)
-    sound = pygame.mixer.Sound(soundPath)
+# left + right volumes for a sound that is not positioned
+CENTRED = (1.0, 1.0)
+
+# sprite sounds fade out with distance from the centre of the view, and can't
+# be heard at all beyond this many view widths
+AUDIBLE_RANGE = 1.0
+
+# sound categories
+EVENT = "event"
+PLAYER = "player"
+CREATURE = "creature"
+
+"""
+Reserved channels, voice cap and priority keyed on sound category.  A category
+always has its reserved channels available, and can also use the shared
+channels up to its voice cap.  When every channel is busy a sound may steal a
+shared channel from a lower priority sound.
+"""
+CATEGORIES = {EVENT: (2, 4, 3),
+              PLAYER: (1, 3, 2),
+              CREATURE: (1, 3, 1)}
+
+SHARED_CHANNELS = 4
+
+"""
+Sound file, volume, category and throttle ticks keyed on sound name.  A
+throttled sound plays at most once every so many ticks - any further requests
+in that time are collapsed into one that is played when the time is up.
+Sounds are only loaded when they are first used, or when preloaded for a map.
+"""
+SOUNDS = {"pickup": ("pickup.wav", 1.0, EVENT, 0),
+          "door": ("door.wav", 1.0, EVENT, 0),
+          "checkpoint": ("checkpoint.wav", 0.8, EVENT, 0),
+          "swoosh": ("swoosh.wav", 0.4, EVENT, 0),
+          "lifelost": ("lifelost.wav", 1.0, EVENT, 0),
+          "endgame": ("endgame.wav", 0.6, EVENT, 0),
+          "footstep": ("footstep.wav", 0.5, PLAYER, 0),
+          "falling": ("falling.wav", 0.2, PLAYER, 0),
+          "wasp": ("wasp.wav", 0.8, CREATURE, 0),
+          "beetle": ("beetle.wav", 0.2, CREATURE, 15)}
+
+# sounds that can be played on any map
+PLAYER_SOUNDS = ["footstep", "swoosh", "lifelost", "falling"]
+
+# sounds required for each type of map sprite
+SPRITE_SOUNDS = {"coin": ["pickup"],
+                 "key": ["pickup"],
+                 "door": ["door"],
+                 "checkpoint": ["checkpoint"],
+                 "wasp": ["wasp"],
+                 "beetle": ["beetle"]}
+
+# loaded sounds keyed on name
+soundCache = {}
+soundLock = threading.Lock()
+
+def loadSound(name):
+    fileName, volume, category, throttleTicks = SOUNDS[name]
+    sound = pygame.mixer.Sound(os.path.join(SOUNDS_FOLDER, fileName))
     sound.set_volume(volume)
     return sound
 
-pickupSound = getSound("pickup.wav", 1.0)
-doorSound = getSound("door.wav", 1.0)
-checkpointSound = getSound("checkpoint.wav", 0.8)
-swooshSound = getSound("swoosh.wav", 0.4)
-lifeLostSound = getSound("lifelost.wav", 1.0)
-endGameSound = getSound("endgame.wav", 0.6)
-footstepSound = getSound("footstep.wav", 0.5)
-waspSound = getSound("wasp.wav", 0.8)
-beetleSound = getSound("beetle.wav", 0.2)
-fallingSound = getSound("falling.wav", 0.2)
+"""
+Returns the named sound, loading it if required.  Returns None if the mixer
+has not been initialised.
+"""
+def getSound(name):
+    sound = soundCache.get(name)
+    if sound:
+        return sound
+    if not pygame.mixer.get_init():
+        return None
+    with soundLock:
+        # the sound may have been loaded while we were waiting
+        if name not in soundCache:
+            soundCache[name] = loadSound(name)
+        return soundCache[name]
+
+"""
+Returns the names of the sounds that may be played on the given map.
+"""
+def getMapSounds(rpgMap):
+    names = list(PLAYER_SOUNDS)
+    for mapSprite in rpgMap.mapSprites or []:
+        for name in SPRITE_SOUNDS.get(mapSprite.type, []):
+            if name not in names:
+                names.append(name)
+    return names
+
+"""
+Loads the named sounds on a background thread.  Returns the thread, or None if
+there is nothing to load.
+"""
+def preloadSounds(names):
+    names = [name for name in names if name not in soundCache]
+    if not names or not pygame.mixer.get_init():
+        return None
+    thread = threading.Thread(target = lambda: [getSound(name) for name in names], name = "SoundPreloader")
+    thread.daemon = True
+    thread.start()
+    return thread
+
+"""
+Plays the background music for each map.  Music is streamed by
+pygame.mixer.music, so only a small buffer is decoded at a time however long
+the track is.
+
+Opening tracks and fading between them is done on a background thread so it
+never holds up the game loop.  Only the most recently requested track is
+played - requests made while a track is fading out supersede earlier ones.
+pygame only streams one track at a time, so the old track fades out before the
+new one fades in.  Requesting the track that is already playing does nothing.
+"""
+class MusicPlayer:
+    
+    def __init__(self, folder = MUSIC_FOLDER, fadeMillis = MUSIC_FADE_MILLIS):
+        self.folder = folder
+        self.fadeMillis = fadeMillis
+        self.condition = threading.Condition()
+        self.requestedTrack = None
+        self.currentTrack = None
+        self.musicOn = True
+        self.busy = False
+        self.thread = None
+        # instrumentation
+        self.trackCount = 0
+        self.errorCount = 0
+        
+    """
+    Requests the given track, or silence if track is None.
+    """
+    def play(self, track):
+        with self.condition:
+            self.requestedTrack = track
+            self.notify()
+            
+    def toggleMusic(self):
+        with self.condition:
+            self.musicOn = not self.musicOn
+            self.notify()
+            
+    # must be called with the condition held
+    def notify(self):
+        if not pygame.mixer.get_init():
+            return
+        if not self.thread:
+            self.thread = threading.Thread(target = self.run, name = "MusicPlayer")
+            self.thread.daemon = True
+            self.thread.start()
+        self.condition.notify_all()
+        
+    # must be called with the condition held
+    def getWantedTrack(self):
+        if self.musicOn:
+            return self.requestedTrack
+        return None
+    
+    def isSettled(self):
+        return not self.busy and self.getWantedTrack() == self.currentTrack
+    
+    """
+    Waits until the wanted track is playing.  Does nothing if the mixer has not
+    been initialised.
+    """
+    def flush(self):
+        with self.condition:
+            if self.thread:
+                while not self.isSettled():
+                    self.condition.wait()
+        
+    def run(self):
+        while True:
+            with self.condition:
+                while self.isSettled():
+                    self.condition.wait()
+                self.busy = True
+                fadeOut = self.currentTrack
+                track = self.getWantedTrack()
+            played = False
+            try:
+                if fadeOut:
+                    pygame.mixer.music.fadeout(self.fadeMillis)
+                    time.sleep(self.fadeMillis / 1000)
+                    pygame.mixer.music.unload()
+                with self.condition:
+                    # a later request may have arrived during the fade
+                    track = self.getWantedTrack()
+                if track:
+                    pygame.mixer.music.load(os.path.join(self.folder, track))
+                    pygame.mixer.music.set_volume(MUSIC_VOLUME)
+                    pygame.mixer.music.play(-1, fade_ms = self.fadeMillis)
+                    played = True
+            except Exception as e:
+                # eg. a missing track or a mixer that has been shut down - the
+                # player must keep running for the next request
+                print("music failed: %s" % e)
+            finally:
+                with self.condition:
+                    if played:
+                        self.trackCount += 1
+                    elif track:
+                        self.errorCount += 1
+                    # a failed track is not retried until another track is requested
+                    self.currentTrack = track
+                    self.busy = False
+                    self.condition.notify_all()
+
+"""
+Plays sounds on explicitly managed mixer channels - see CATEGORIES.
+"""
+class ChannelManager:
+    
+    def __init__(self):
+        channelCount = sum(reserved for reserved, maxVoices, priority in CATEGORIES.values()) + SHARED_CHANNELS
+        pygame.mixer.set_num_channels(channelCount)
+        # stop pygame picking channels for us
+        pygame.mixer.set_reserved(channelCount)
+        self.channels = [pygame.mixer.Channel(i) for i in range(channelCount)]
+        # channel indexes reserved for each category, followed by the shared channels
+        self.reservedChannels = {}
+        index = 0
+        for category in sorted(CATEGORIES):
+            reserved = CATEGORIES[category][0]
+            self.reservedChannels[category] = list(range(index, index + reserved))
+            index += reserved
+        self.sharedChannels = list(range(index, channelCount))
+        # the category + sequence number of the last voice played on each channel
+        self.voices = {}
+        self.sequence = 0
+        # counters
+        self.playedCounts = dict((category, 0) for category in CATEGORIES)
+        self.stolenCounts = dict((category, 0) for category in CATEGORIES)
+        self.droppedCounts = dict((category, 0) for category in CATEGORIES)
+        
+    def isBusy(self, index):
+        return index in self.voices and self.channels[index].get_busy()
+    
+    def getVoiceAge(self, index):
+        return self.voices[index][1]
+    
+    def getVoicePriority(self, index):
+        return CATEGORIES[self.voices[index][0]][2]
+    
+    """
+    Returns the index of the channel the given category should play on next,
+    or None if there is no channel available.
+    """
+    def getChannel(self, category):
+        reserved, maxVoices, priority = CATEGORIES[category]
+        voices = [index for index in self.voices if self.voices[index][0] == category and self.isBusy(index)]
+        if len(voices) >= maxVoices:
+            # replace the oldest voice in this category
+            return min(voices, key = self.getVoiceAge)
+        for index in self.reservedChannels[category] + self.sharedChannels:
+            if not self.isBusy(index):
+                return index
+        # steal a shared channel from the lowest priority, oldest voice
+        candidates = [index for index in self.sharedChannels if self.getVoicePriority(index) < priority]
+        if candidates:
+            return min(candidates, key = lambda index: (self.getVoicePriority(index), self.getVoiceAge(index)))
+        return None
+    
+    def play(self, sound, category, volumes = CENTRED):
+        index = self.getChannel(category)
+        if index is None:
+            self.droppedCounts[category] += 1
+            return
+        if self.isBusy(index):
+            self.stolenCounts[self.voices[index][0]] += 1
+        channel = self.channels[index]
+        channel.play(sound)
+        # the channel volume is reset by play
+        channel.set_volume(*volumes)
+        self.sequence += 1
+        self.voices[index] = (category, self.sequence)
+        self.playedCounts[category] += 1
+    
+"""
+Returns the left + right volumes for a sound at the given map position, or None
+if it is out of earshot of the view.
+"""
+def getStereoVolumes(position, viewRect):
+    dx = position[0] - viewRect.centerx
+    dy = position[1] - viewRect.centery
+    volume = 1.0 - math.hypot(dx, dy) / (viewRect.width * AUDIBLE_RANGE)
+    if volume <= 0:
+        return None
+    pan = max(-1.0, min(1.0, dx / (viewRect.width / 2)))
+    return volume * min(1.0, 1.0 - pan), volume * min(1.0, 1.0 + pan)
 
 """
-Listens for specific events and builds up a set of sounds that are played back
-when flush is called.
+Listens for specific events and builds up the sounds that are played back when
+flush is called.  Sounds from positional events are panned + attenuated
+relative to the view rect, and dropped if they are out of earshot.
 """
 class SoundHandler:
     
     def __init__(self):
-        self.sounds = set()
-        # properties required for 
-        self.nextSound = None
+        # sets of left + right volumes keyed on sound name
+        self.sounds = {}
+        # throttled sounds keyed on name - see SOUNDS
+        self.throttleCounts = {}
+        self.pendingSounds = {}
         self.soundOn = True
-        self.ready = True
-        self.count = 0
+        self.viewRect = None
+        self.channelManager = None
+        self.culledCount = 0
+        self.reset()
+        
+    """
+    Discards any pending sounds.  Note that this does not affect soundOn.
+    """
+    def reset(self):
+        self.sounds.clear()
+        self.throttleCounts.clear()
+        self.pendingSounds.clear()
+        
+    """
+    Sets the view that positional sounds are heard from.  The rect is kept, so
+    it should be updated in place as the view moves.
+    """
+    def setViewRect(self, viewRect):
+        self.viewRect = viewRect
+    
+    def addSound(self, name, volumes = CENTRED):
+        throttleTicks = SOUNDS[name][3]
+        if throttleTicks:
+            if name in self.throttleCounts:
+                # played too recently - play the latest request later
+                self.pendingSounds[name] = volumes
+                return
+            self.throttleCounts[name] = 0
+        self.sounds.setdefault(name, set()).add(volumes)
+        
+    def addPositionalSound(self, name, positionalEvent):
+        if not self.viewRect:
+            self.addSound(name)
+            return
+        volumes = getStereoVolumes(positionalEvent.position, self.viewRect)
+        if volumes:
+            self.addSound(name, volumes)
+        else:
+            self.culledCount += 1
             
     def coinCollected(self, coinCollectedEvent):
-        self.sounds.add(pickupSound)
+        self.addSound("pickup")
         
     def keyCollected(self, keyCollectedEvent):
-        self.sounds.add(pickupSound)
+        self.addSound("pickup")
         
     def doorOpening(self, doorOpeningEvent):
-        self.sounds.add(doorSound)
+        self.addSound("door")
         
     def checkpointReached(self, checkpointEvent):
-        self.sounds.add(checkpointSound)
+        self.addSound("checkpoint")
         
     def playerFootstep(self, playerFootstepEvent):
-        self.sounds.add(footstepSound)
+        self.addSound("footstep")
         
     def mapTransition(self, mapTransitionEvent):
-        self.sounds.add(swooshSound)
+        self.addSound("swoosh")
         
     def endGame(self, endGameEvent):
-        self.sounds.add(endGameSound)
+        self.addSound("endgame")
         
     def lifeLost(self, lifeLostEvent):
-        self.sounds.add(lifeLostSound)
+        self.addSound("lifelost")
     
     def waspZooming(self, waspZoomingEvent):
-        self.sounds.add(waspSound)
+        self.addPositionalSound("wasp", waspZoomingEvent)
         
     def playerFalling(self, playerFallingEvent):
-        self.sounds.add(fallingSound)
+        self.addSound("falling")
     
-    """
-    Additional logic here to prevent a 'log jam' of beetle crawling sounds
-    """    
     def beetleCrawling(self, beetleCrawlingEvent):
-        # if we already have a next sound, ignore it
-        if self.nextSound:
-            return
-        # if ready, add the sound to the set for immediate playback
-        if self.ready:
-            self.sounds.add(beetleSound)
-            self.ready = False
-            self.count = 0
-            return
-        # we're not ready yet - store the sound for later
-        self.nextSound = beetleSound
-        
-    def handleNextSound(self):
-        self.count = (self.count + 1) % BEETLE_SOUND_TICKS
-        if self.count == 0:
-            if self.nextSound:
-                self.sounds.add(self.nextSound)
-                self.nextSound = None
-            else:
-                self.ready = True
+        self.addPositionalSound("beetle", beetleCrawlingEvent)
+        
+    """
+    Counts down the throttled sounds and adds any pending ones that are due.
+    """
+    def handleThrottledSounds(self):
+        for name in list(self.throttleCounts):
+            count = (self.throttleCounts[name] + 1) % SOUNDS[name][3]
+            if count == 0 and name not in self.pendingSounds:
+                del self.throttleCounts[name]
+                continue
+            if count == 0:
+                self.sounds.setdefault(name, set()).add(self.pendingSounds.pop(name))
+            self.throttleCounts[name] = count
         
     def flush(self):
-        self.handleNextSound()
         # play sounds
-        for sound in self.sounds:
-            if self.soundOn:
-                sound.play()
+        if self.soundOn and self.sounds and pygame.mixer.get_init():
+            if not self.channelManager:
+                self.channelManager = ChannelManager()
+            for name in self.sounds:
+                sound = getSound(name)
+                if sound:
+                    for volumes in self.sounds[name]:
+                        self.channelManager.play(sound, SOUNDS[name][2], volumes)
         self.sounds.clear()
+        # queue any throttled sounds that are due for the next flush
+        self.handleThrottledSounds()
         
     def toggleSound(self):
         self.soundOn = not self.soundOn
-        
\ No newline at end of file
+        
@@ -0,0 +1,133 @@
+#! /usr/bin/env python
+
+import os
+import wave
+import shutil
+import tempfile
+import unittest
+import pygame
+
+from pygame.locals import Rect
+from . import sounds, events
+
+# run without a sound card
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+def setUpModule():
+    global silence
+    if not pygame.mixer.get_init():
+        pygame.mixer.init(44100, -16, 2, 1024)
+    # long enough to still be playing when each test finishes
+    silence = pygame.mixer.Sound(buffer = bytes(44100 * 4 * 10))
+
+class MapSprite:
+
+    def __init__(self, type):
+        self.type = type
+
+class RpgMap:
+
+    def __init__(self, *types):
+        self.mapSprites = [MapSprite(type) for type in types]
+
+class SoundsTest(unittest.TestCase):
+
+    def testMapSounds(self):
+        names = sounds.getMapSounds(RpgMap("coin", "beetle", "key", "flames", "beetle"))
+        self.assertEqual(sounds.PLAYER_SOUNDS + ["pickup", "beetle"], names)
+        
+    def testEverySoundIsDefined(self):
+        for names in list(sounds.SPRITE_SOUNDS.values()) + [sounds.PLAYER_SOUNDS]:
+            for name in names:
+                self.assertIn(name, sounds.SOUNDS)
+
+class ChannelManagerTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.channelManager = sounds.ChannelManager()
+        
+    def tearDown(self):
+        pygame.mixer.stop()
+        
+    def testVoiceCap(self):
+        maxVoices = sounds.CATEGORIES[sounds.PLAYER][1]
+        for i in range(maxVoices + 2):
+            self.channelManager.play(silence, sounds.PLAYER)
+        voices = [voice for voice in self.channelManager.voices.values() if voice[0] == sounds.PLAYER]
+        self.assertEqual(maxVoices, len(voices))
+        self.assertEqual(2, self.channelManager.stolenCounts[sounds.PLAYER])
+        
+    def testHigherPriorityStealsSharedChannel(self):
+        # fill the shared channels with lower priority sounds
+        for category in (sounds.CREATURE, sounds.PLAYER):
+            for i in range(sounds.CATEGORIES[category][1]):
+                self.channelManager.play(silence, category)
+        for i in range(sounds.CATEGORIES[sounds.EVENT][0] + 1):
+            self.channelManager.play(silence, sounds.EVENT)
+        self.assertEqual(1, self.channelManager.stolenCounts[sounds.CREATURE])
+        self.assertEqual(0, self.channelManager.stolenCounts[sounds.PLAYER])
+        # nothing lower than a creature to steal from
+        self.channelManager.play(silence, sounds.CREATURE)
+        self.assertEqual(1, self.channelManager.droppedCounts[sounds.CREATURE])
+        
+class SoundHandlerTest(unittest.TestCase):
+    
+    def testThrottledSoundsAreCollapsed(self):
+        soundHandler = sounds.SoundHandler()
+        self.addCleanup(sounds.soundCache.pop, "beetle", None)
+        sounds.soundCache["beetle"] = silence
+        throttleTicks = sounds.SOUNDS["beetle"][3]
+        played = []
+        for tick in range(throttleTicks * 3):
+            soundHandler.beetleCrawling(None)
+            soundHandler.flush()
+            played.append(soundHandler.channelManager.playedCounts[sounds.CREATURE])
+        # played straight away, then once per throttle period
+        self.assertEqual(3, played[-1])
+        self.assertEqual([0, throttleTicks, throttleTicks * 2], [played.index(count) for count in (1, 2, 3)])
+
+    def testPositionalSoundsArePannedAndCulled(self):
+        soundHandler = sounds.SoundHandler()
+        soundHandler.setViewRect(Rect(0, 0, 400, 300))
+        soundHandler.waspZooming(events.WaspZoomingEvent((200, 150)))
+        soundHandler.waspZooming(events.WaspZoomingEvent((300, 150)))
+        soundHandler.waspZooming(events.WaspZoomingEvent((900, 150)))
+        self.assertEqual({(1.0, 1.0), (0.375, 0.75)}, soundHandler.sounds["wasp"])
+        self.assertEqual(1, soundHandler.culledCount)
+
+class MusicPlayerTest(unittest.TestCase):
+    
+    def setUp(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        for track in ("one.wav", "two.wav"):
+            with wave.open(os.path.join(folder, track), "wb") as trackFile:
+                trackFile.setnchannels(1)
+                trackFile.setsampwidth(2)
+                trackFile.setframerate(22050)
+                trackFile.writeframes(bytes(22050 * 2))
+        self.musicPlayer = sounds.MusicPlayer(folder, 10)
+        self.addCleanup(pygame.mixer.music.stop)
+        
+    def testLatestTrackIsPlayed(self):
+        self.musicPlayer.play("one.wav")
+        self.musicPlayer.play("two.wav")
+        self.musicPlayer.flush()
+        self.assertEqual("two.wav", self.musicPlayer.currentTrack)
+        self.assertTrue(pygame.mixer.music.get_busy())
+        # requesting the same track again does not restart it
+        trackCount = self.musicPlayer.trackCount
+        self.musicPlayer.play("two.wav")
+        self.musicPlayer.flush()
+        self.assertEqual(trackCount, self.musicPlayer.trackCount)
+        
+    def testMissingTrackIsSkipped(self):
+        self.musicPlayer.play("missing.wav")
+        self.musicPlayer.flush()
+        self.assertEqual(1, self.musicPlayer.errorCount)
+        self.musicPlayer.play(None)
+        self.musicPlayer.flush()
+        self.assertIsNone(self.musicPlayer.currentTrack)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,8 @@
 
 import pygame
 
+from .view import TILE_SIZE
+
 from .othersprites import Beetle, Wasp
 from .staticsprites import Flames, Coin, Key, Chest, Rock, Door, Checkpoint
 
@@ -17,35 +19,131 @@ spriteClasses = {"flames": Flames,
                  "checkpoint" : Checkpoint}
 
 """
-Returns a sprite instance based on the given mapSprite.  If the registry
-indicates that the sprite has been removed from the map, this method returns
-None.
+Pool of unused sprites keyed on sprite class.  Rather than constructing every
+sprite from scratch each time a map is (re)visited, sprites are released back
+into the pool when a play state is discarded, and reset before being reused.
+"""
+class SpritePool:
+    
+    def __init__(self):
+        self.sprites = {}
+        # counters
+        self.hits = 0
+        self.misses = 0
+        
+    def acquire(self, spriteClass):
+        pooledSprites = self.sprites.get(spriteClass)
+        if pooledSprites:
+            self.hits += 1
+            return pooledSprites.pop()
+        self.misses += 1
+        return spriteClass()
+    
+    def release(self, sprite):
+        sprite.kill()
+        # only sprites created by the sprite builder are pooled
+        spriteClass = sprite.__class__
+        if spriteClass in POOLED_CLASSES:
+            sprite.reset()
+            self.sprites.setdefault(spriteClass, []).append(sprite)
+
+# margins around the view for creating/demoting sprites
+LOAD_MARGIN = 2 * TILE_SIZE
+UNLOAD_MARGIN = 4 * TILE_SIZE
+
+# sprite classes that can be pooled
+POOLED_CLASSES = set(spriteClasses.values())
+
+spritePool = SpritePool()
+
+"""
+Returns a sprite instance based on the given mapSprite.
 """
-def createSprite(mapSprite, rpgMap, eventBus, registry):
-    spriteMetadata = registry.getMetadata(mapSprite.uid);
-    if spriteMetadata:
+def createSprite(mapSprite, rpgMap, eventBus):
+    spriteClass = spriteClasses[mapSprite.type]
+    sprite = spritePool.acquire(spriteClass)
+    sprite.setup(mapSprite.uid, rpgMap, eventBus)
+    sprite.initMovement(mapSprite.level, mapSprite.tilePoints)
+    return sprite
+
+"""
+Maintains the sprite group for the given map.  This excludes any sprites that
+are removed from the map.
+
+The registry metadata for the map is retrieved in one call and its map actions
+are applied when the loader is created, but the real sprites are only created
+once the view (plus a margin) approaches their tile positions - until then the
+map sprite acts as a lightweight placeholder.  Static sprites that move well
+clear of the view are demoted back to placeholders and released to the sprite
+pool.
+"""
+class SpriteLoader:
+    
+    def __init__(self, rpgMap, eventBus, registry):
+        self.rpgMap = rpgMap
+        self.eventBus = eventBus
+        self.gameSprites = pygame.sprite.Group()
+        # map sprites that have not been created yet
+        self.placeholders = []
+        # map sprites keyed on the sprites created from them
+        self.loadedSprites = {}
         # allow any interactions with the map, eg. an open door
-        spriteMetadata.applyMapActions(rpgMap)
-        if spriteMetadata.isRemovedFromMap():
-            return None
-    if mapSprite.type in spriteClasses:
-        spriteClass = spriteClasses[mapSprite.type]
-        sprite = spriteClass()
-        sprite.setup(mapSprite.uid, rpgMap, eventBus)
-        return sprite
-    print("sprite type not found:", mapSprite.type) 
-    return None
-
-"""
-Returns a sprite group for the given map.  This excludes any sprites that are
-removed from the map.
-"""
-def createSpritesForMap(rpgMap, eventBus, registry):
-    gameSprites = pygame.sprite.Group()
-    if rpgMap.mapSprites:
-        for mapSprite in rpgMap.mapSprites:
-            sprite = createSprite(mapSprite, rpgMap, eventBus, registry)
-            if sprite:
-                sprite.initMovement(mapSprite.level, mapSprite.tilePoints)
-                gameSprites.add(sprite)
-    return gameSprites
+        mapMetadata = registry.getMapMetadata(rpgMap.name)
+        for spriteMetadata in mapMetadata.values():
+            spriteMetadata.applyMapActions(rpgMap)
+        if rpgMap.mapSprites:
+            for mapSprite in rpgMap.mapSprites:
+                spriteMetadata = mapMetadata.get(mapSprite.uid)
+                if spriteMetadata and spriteMetadata.isRemovedFromMap():
+                    continue
+                if mapSprite.type not in spriteClasses:
+                    print("sprite type not found:", mapSprite.type)
+                    continue
+                self.placeholders.append(mapSprite)
+                
+    def update(self, viewRect):
+        # demote static sprites that are well clear of the view
+        unloadRect = viewRect.inflate(UNLOAD_MARGIN * 2, UNLOAD_MARGIN * 2)
+        for sprite in list(self.loadedSprites):
+            if not sprite.alive():
+                # the sprite has been removed from the map
+                del self.loadedSprites[sprite]
+            elif sprite.isStatic() and not sprite.mapRect.colliderect(unloadRect):
+                self.placeholders.append(self.loadedSprites.pop(sprite))
+                spritePool.release(sprite)
+        # create sprites for any placeholders that are approaching the view
+        if self.placeholders:
+            loadRect = viewRect.inflate(LOAD_MARGIN * 2, LOAD_MARGIN * 2)
+            placeholders = []
+            for mapSprite in self.placeholders:
+                if mapSprite.mapRect.colliderect(loadRect):
+                    sprite = createSprite(mapSprite, self.rpgMap, self.eventBus)
+                    self.gameSprites.add(sprite)
+                    self.loadedSprites[sprite] = mapSprite
+                else:
+                    placeholders.append(mapSprite)
+            self.placeholders = placeholders
+            
+    """
+    Creates the sprite for the given uid straight away, eg. to bring back a
+    sprite that has been removed from the map.  Returns None if the map has no
+    such sprite.
+    """
+    def restoreSprite(self, uid):
+        for mapSprite in self.rpgMap.mapSprites:
+            if mapSprite.uid == uid:
+                if mapSprite in self.placeholders:
+                    self.placeholders.remove(mapSprite)
+                sprite = createSprite(mapSprite, self.rpgMap, self.eventBus)
+                self.gameSprites.add(sprite)
+                self.loadedSprites[sprite] = mapSprite
+                return sprite
+        return None
+
+"""
+Releases the given sprites back to the sprite pool.  The sprites must not be
+used again once this has been called.
+"""
+def releaseSprites(gameSprites):
+    for sprite in gameSprites.sprites():
+        spritePool.release(sprite)
@@ -1,78 +1,130 @@
 #!/usr/bin/env python
 
-from . import view
-
 from .view import DOWN
 
 DIRECTION = "direction"
 
-class SpriteFrames:
-    
-    def __init__(self, frameSkip = None):
+"""
+Works out which frame of an animation to show from the number of ticks of game
+time that have passed, where each frame is shown for frameSkip ticks.  Any
+number of ticks can be added at once - eg. when a sprite is only updated every
+so often - and the animation ends up on the same frame as if it had been
+advanced one tick at a time.  An animation without a frameSkip never moves on
+from its current frame.
+
+A looping animation wraps back round to the first frame.  Otherwise the frame
+index stops at numFrames, one past the last frame, when the animation is
+finished.
+"""
+class AnimationClock:
+
+    def __init__(self, frameSkip, numFrames, loop = True):
         self.frameSkip = frameSkip
+        self.numFrames = numFrames
+        self.loop = loop
+        # ticks into the current frame
         self.frameCount = 0
         self.frameIndex = 0
 
+    """
+    Adds the given number of ticks.  Returns the new frame index if the frame
+    has changed, or None.
+    """
+    def advance(self, ticks = 1):
+        if not ticks or not self.frameSkip or self.isFinished():
+            return None
+        frames, self.frameCount = divmod(self.frameCount + ticks, self.frameSkip)
+        if not frames:
+            return None
+        if self.loop:
+            self.frameIndex = (self.frameIndex + frames) % self.numFrames
+        else:
+            self.frameIndex = min(self.frameIndex + frames, self.numFrames)
+        return self.frameIndex
+
+    def isFinished(self):
+        return not self.loop and self.frameIndex == self.numFrames
+
+    def reset(self):
+        self.frameCount = 0
+        self.frameIndex = 0
+
+class SpriteFrames:
+    
+    def __init__(self, frameSkip, numFrames):
+        self.frameSkip = frameSkip
+        self.numFrames = numFrames
+        self.clock = AnimationClock(frameSkip, numFrames)
+        # the shared frame that has been copied for masking, if any
+        self.unmaskedFrame = None
+
     def advanceFrameIndex(self, increment = 1):
-        if increment and self.frameSkip:
-            self.frameCount = (self.frameCount + increment) % self.frameSkip
-            if self.frameCount == 0:
-                self.frameIndex = (self.frameIndex + 1) % self.numFrames
-                return self.frameIndex
-        return None
+        return self.clock.advance(increment)
+    
+    """
+    Animation frames are shared by every sprite of the same class, so masks must
+    never be drawn onto them directly.  Instead, a private copy of the frame is
+    returned for masking - this is released again by repairCurrentFrame.
+    """
+    def copyCurrentFrame(self, frame):
+        self.unmaskedFrame = frame
+        return frame.copy()
     
+    """
+    Releases the private copy of the masked frame and returns the shared frame.
+    """
     def repairCurrentFrame(self):
-        pass
+        frame, self.unmaskedFrame = self.unmaskedFrame, None
+        return frame
     
     def advanceFrame(self, increment = 1, **kwargs):
         pass
 
+    def reset(self):
+        self.clock.reset()
+        self.unmaskedFrame = None
+
     def getState(self):
-        return self.frameCount, self.frameIndex, DOWN
+        return self.clock.frameCount, self.clock.frameIndex, DOWN
 
     def setState(self, spriteFrames):
-        self.frameCount, self.frameIndex, direction = spriteFrames.getState() 
+        self.restoreState(*spriteFrames.getState())
         return self   
+
+    def restoreState(self, frameCount, frameIndex, direction):
+        self.clock.frameCount, self.clock.frameIndex = frameCount, frameIndex
             
 class StaticFrames(SpriteFrames):
     
     def __init__(self, animationFrames, frameSkip = None):
-        SpriteFrames.__init__(self, frameSkip)
-        self.virginAnimationFrames = animationFrames
-        self.animationFrames = view.copyStaticFrames(animationFrames)
-        self.numFrames = len(self.animationFrames)
-
-    def repairCurrentFrame(self):
-        lastImage = self.animationFrames[self.frameIndex]
-        lastImage.blit(self.virginAnimationFrames[self.frameIndex], (0, 0))
+        SpriteFrames.__init__(self, frameSkip, len(animationFrames))
+        self.animationFrames = animationFrames
 
     def advanceFrame(self, increment = 1, **kwargs):
         newFrameIndex = self.advanceFrameIndex(increment)
-        return self.animationFrames[self.frameIndex], newFrameIndex
+        return self.animationFrames[self.clock.frameIndex], newFrameIndex
     
 class DirectionalFrames(SpriteFrames):
     
     def __init__(self, animationFrames, frameSkip = None):
-        SpriteFrames.__init__(self, frameSkip)
-        self.virginAnimationFrames = animationFrames
-        self.animationFrames = view.copyMovementFrames(animationFrames)
-        self.numFrames = len(animationFrames[DOWN])
+        SpriteFrames.__init__(self, frameSkip, len(animationFrames[DOWN]))
+        self.animationFrames = animationFrames
         self.direction = DOWN
 
-    def repairCurrentFrame(self):
-        lastImage = self.animationFrames[self.direction][self.frameIndex]
-        lastImage.blit(self.virginAnimationFrames[self.direction][self.frameIndex], (0, 0))
-        
     def advanceFrame(self, increment = 1, **kwargs):
         newFrameIndex = self.advanceFrameIndex(increment)
         if DIRECTION in kwargs:
             self.direction = kwargs[DIRECTION]
-        return self.animationFrames[self.direction][self.frameIndex], newFrameIndex
+        return self.animationFrames[self.direction][self.clock.frameIndex], newFrameIndex
+
+    def reset(self):
+        SpriteFrames.reset(self)
+        self.direction = DOWN
 
     def getState(self):
-        return self.frameCount, self.frameIndex, self.direction
+        return self.clock.frameCount, self.clock.frameIndex, self.direction
 
-    def setState(self, spriteFrames):
-        self.frameCount, self.frameIndex, self.direction = spriteFrames.getState()
-        return self   
+    def restoreState(self, frameCount, frameIndex, direction):
+        SpriteFrames.restoreState(self, frameCount, frameIndex, direction)
+        self.direction = direction
             
@@ -0,0 +1,38 @@
+#! /usr/bin/env python
+
+import unittest
+
+from .spriteframes import AnimationClock, StaticFrames
+
+class AnimationClockTest(unittest.TestCase):
+
+    def testLoopingAnimation(self):
+        clock = AnimationClock(6, 4)
+        newFrames = [clock.advance() for i in range(30)]
+        self.assertEqual([1, 2, 3, 0, 1], [i for i in newFrames if i is not None])
+        self.assertEqual((0, 1), (clock.frameCount, clock.frameIndex))
+
+    def testTicksAddedAtOnce(self):
+        clock, lazyClock = AnimationClock(6, 4), AnimationClock(6, 4)
+        for ticks in (1, 5, 7, 13, 2, 30):
+            for i in range(ticks):
+                clock.advance()
+            lazyClock.advance(ticks)
+            self.assertEqual((clock.frameCount, clock.frameIndex),
+                             (lazyClock.frameCount, lazyClock.frameIndex))
+
+    def testAnimationThatEnds(self):
+        clock = AnimationClock(6, 8, False)
+        self.assertEqual(7, clock.advance(47))
+        self.assertFalse(clock.isFinished())
+        self.assertEqual(8, clock.advance(100))
+        self.assertTrue(clock.isFinished())
+        self.assertIsNone(clock.advance())
+
+    def testFramesWithoutFrameSkip(self):
+        spriteFrames = StaticFrames(["a", "b"])
+        spriteFrames.restoreState(0, 1, None)
+        self.assertEqual(("b", None), spriteFrames.advanceFrame(100))
+
+if __name__ == "__main__":
+    unittest.main()
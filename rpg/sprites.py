@@ -39,6 +39,16 @@ class RpgSprite(pygame.sprite.Sprite):
         # indicates if this sprite should be removed on next update
         self.toRemove = False
         
+    """
+    Returns the frames + flags to their initial state so the sprite can be reused.
+    """
+    def reset(self):
+        self.spriteFrames.reset()
+        self.image, temp = self.spriteFrames.advanceFrame(0)
+        self.inView = False
+        self.masked = False
+        self.toRemove = False
+        
     def setup(self, uid, rpgMap, eventBus):
         self.uid = uid
         self.rpgMap = rpgMap
@@ -86,13 +96,14 @@ class RpgSprite(pygame.sprite.Sprite):
     def clearMasks(self):
         if self.masked:
             self.masked = False
-            self.spriteFrames.repairCurrentFrame()
+            self.image = self.spriteFrames.repairCurrentFrame()
         
     def applyMasks(self):
         # masks is a map of lists, keyed on the associated tile points
         masks = self.rpgMap.getMasks(self)
         if len(masks) > 0:
             self.masked = True
+            self.image = self.spriteFrames.copyCurrentFrame(self.image)
             for tilePoint in masks:
                 px = tilePoint[0] * view.TILE_SIZE - self.mapRect.left
                 py = tilePoint[1] * view.TILE_SIZE - self.mapRect.top
@@ -125,6 +136,15 @@ class OtherSprite(RpgSprite):
         RpgSprite.__init__(self, spriteFrames, position)
         self.movement = None
     
+    """
+    Returns the sprite to the state it was in when first constructed.  This
+    allows sprite instances to be pooled and reused - setup and initMovement
+    must still be called before the sprite is used again.
+    """
+    def reset(self):
+        RpgSprite.reset(self)
+        self.movement = None
+    
     def update(self, player, gameSprites, visibleSprites, increment):
         # remove the sprite if required
         if self.toRemove:
@@ -134,6 +154,13 @@ class OtherSprite(RpgSprite):
         # otherwise apply movement
         px, py, metadata = self.getMovement(player)            
         self.doMove(px, py)
+        self.updateView(player, visibleSprites, increment, metadata)
+        
+    """
+    Positions the sprite relative to the view and adds/removes it from the
+    visible sprites as required.
+    """
+    def updateView(self, player, visibleSprites, increment = 0, metadata = NO_METADATA):
         # make self.rect relative to the view
         self.rect.topleft = (self.mapRect.left - player.viewRect.left,
                              self.mapRect.top - player.viewRect.top)
@@ -164,6 +191,24 @@ class OtherSprite(RpgSprite):
     # base movement method - this is sufficient for static sprites only        
     def getMovement(self, player):
         return NO_MOVEMENT
+    
+    # indicates if this sprite can be discarded while out of view and recreated later
+    def isStatic(self):
+        return True
+    
+    """
+    Returns the state needed to rewind this sprite as a tuple of ints:
+    (x, y, extra, frameCount, frameIndex, direction).  Sprites with movement
+    state of their own pack it into extra.  See rewind.py.
+    """
+    def getRewindState(self):
+        frameCount, frameIndex, direction = self.spriteFrames.getState()
+        return self.mapRect.left, self.mapRect.top, 0, frameCount, frameIndex, direction
+    
+    def setRewindState(self, x, y, extra, frameCount, frameIndex, direction):
+        self.toRemove = False
+        self.doMove(x - self.mapRect.left, y - self.mapRect.top)
+        self.spriteFrames.restoreState(frameCount, frameIndex, direction)
                                    
 """
 Sprite group that ensures pseudo z ordering for the sprites.  This works
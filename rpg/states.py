@@ -8,6 +8,7 @@ from . import view
 from . import spritebuilder
 from . import mapevents
 from . import font
+from . import savegame
 
 from pygame.locals import *
 
@@ -17,9 +18,13 @@ from .mapevents import SCENE_TRANSITION, BOUNDARY_TRANSITION, LIFE_LOST_TRANSITI
 
 from .eventbus import EventBus
 from .registry import RegistryHandler, Registry
+from .rewind import Rewinder
+from .profiler import FrameProfiler, EVENTS, COLLISIONS, INPUT, BACKGROUND, UPDATE, DRAW, HUD, OVERLAY, FLIP
 from .player import Ulmo
-from .sounds import SoundHandler
-from .events import MapTransitionEvent, EndGameEvent
+from .sounds import SoundHandler, MusicPlayer, preloadSounds, getMapSounds
+from .events import MapTransitionEvent, EndGameEvent, CoinCollectedEvent, KeyCollectedEvent, DoorOpenedEvent
+from .events import CheckpointReachedEvent, DoorOpeningEvent, PlayerFootstepEvent, LifeLostEvent
+from .events import WaspZoomingEvent, BeetleCrawlingEvent, PlayerFallingEvent
 from .fixedsprites import FixedCoin, CoinCount, KeyCount, Lives, CheckpointIcon
 
 ORIGIN = (0, 0)
@@ -31,6 +36,11 @@ DIMENSIONS = (VIEW_WIDTH, VIEW_HEIGHT)
 BOUNDARY_TICKS = {UP: 24, DOWN: 24, LEFT: 14, RIGHT: 14}
 DOORWAY_TICKS = {UP: 16, DOWN: 16, LEFT: 16, RIGHT: 16}
 
+INITIAL_LIVES = 2
+
+# hold this key to rewind
+REWIND_KEY = K_BACKSPACE
+
 pygame.display.set_caption("Ulmo's Adventure")
 screen = pygame.display.set_mode(DIMENSIONS)
 
@@ -38,49 +48,102 @@ blackRect = view.createRectangle(DIMENSIONS)
 
 gameFont = font.GameFont()
 
+# when headless the display is never shown - see setHeadless
+headless = False
+
+# set by the game loop when the current tick is not going to be shown, so the
+# play state can skip drawing - see setRenderFrame
+renderFrame = True
+# set by the states when they draw to the screen - see updateDisplay
+displayUpdated = False
+
+# optional FrameProfiler - see toggleProfiler
+profiler = None
+
 # globals
 eventBus = None
 registryHandler = None
 soundHandler = None
+musicPlayer = None
+rewinder = None
 fixedSprites = None
 player = None
 
-def startGame(cont = False):
-    global eventBus
-    eventBus = EventBus()
-
-    # create registry handler
-    global registryHandler
+"""
+Returns the first state of a new game.  The event bus, handlers, fixed sprites
+and player are only created for the very first game - subsequent games reuse
+them, along with any assets, fonts, tile sets and maps that have already been
+loaded, and just reset the game state.  A new game starts from the given
+registry, if any, eg. for a replay.
+"""
+def startGame(cont = False, registry = None):
+    # create/reset the registry
     if cont:
         registryHandler.switchToSnapshot()
     else:
-        #registry = Registry("unit", (4, 6), 1)
-        registry = Registry("central", (6, 22), 2)
-        #registry = Registry("central", (22, 20), 3)
-        #registry = Registry("east", (10, 18), 1)
-        #registry = Registry("wasps", (12, 10), 5)
-        registryHandler = RegistryHandler(registry)
+        if not registry:
+            #registry = Registry("unit", (4, 6), 1)
+            registry = Registry("central", (6, 22), 2)
+            #registry = Registry("central", (22, 20), 3)
+            #registry = Registry("east", (10, 18), 1)
+            #registry = Registry("wasps", (12, 10), 5)
+        if registryHandler:
+            registryHandler.setRegistry(registry)
+        else:
+            createGame(registry)
     # grab this for later
     registry = registryHandler.registry
+    # reset the sound handler + fixed sprites
+    eventBus.clearQueue()
+    soundHandler.reset()
+    player.coinCount.setCount(registry.coinCount)
+    player.keyCount.setCount(registry.keyCount)
+    player.lives.setCount(INITIAL_LIVES)
+    player.checkpointIcon.reset()
+    # reset the player + get the map
+    player.reset()
+    rpgMap = parser.getRpgMap(registry.mapName)
+    player.setup("ulmo", rpgMap, eventBus)
+    # set the start position
+    player.setTilePosition(registry.playerPosition[0],
+                           registry.playerPosition[1],
+                           registry.playerLevel)
+
+    # return the play state
+    return PlayState()
+
+"""
+Creates the long-lived game objects.  This is only called once.
+"""
+def createGame(registry):
+    global eventBus
+    eventBus = EventBus()
+
+    # create registry handler
+    global registryHandler
+    registryHandler = RegistryHandler(registry, savegame.SaveGameWriter())
     # add event listeners
-    eventBus.addCoinCollectedListener(registryHandler)
-    eventBus.addKeyCollectedListener(registryHandler)
-    eventBus.addDoorOpenedListener(registryHandler)
-    eventBus.addCheckpointReachedListener(registryHandler)
+    eventBus.addListener(CoinCollectedEvent, registryHandler)
+    eventBus.addListener(KeyCollectedEvent, registryHandler)
+    eventBus.addListener(DoorOpenedEvent, registryHandler)
+    eventBus.addListener(CheckpointReachedEvent, registryHandler)
     
+    # sound only reacts to events, so these are queued until the end of the frame
     global soundHandler
     soundHandler = SoundHandler()
-    eventBus.addCoinCollectedListener(soundHandler)
-    eventBus.addKeyCollectedListener(soundHandler)
-    eventBus.addDoorOpeningListener(soundHandler)
-    eventBus.addPlayerFootstepListener(soundHandler)
-    eventBus.addMapTransitionListener(soundHandler)
-    eventBus.addEndGameListener(soundHandler)
-    eventBus.addLifeLostListener(soundHandler)
-    eventBus.addWaspZoomingListener(soundHandler)
-    eventBus.addBeetleCrawlingListener(soundHandler)
-    eventBus.addCheckpointReachedListener(soundHandler)
-    eventBus.addPlayerFallingListener(soundHandler)
+    for eventType in (CoinCollectedEvent, KeyCollectedEvent, DoorOpeningEvent,
+                      PlayerFootstepEvent, MapTransitionEvent, EndGameEvent,
+                      LifeLostEvent, WaspZoomingEvent, BeetleCrawlingEvent,
+                      CheckpointReachedEvent, PlayerFallingEvent):
+        eventBus.addListener(eventType, soundHandler, True)
+    global musicPlayer
+    musicPlayer = MusicPlayer()
+    
+    global rewinder
+    rewinder = Rewinder(registryHandler)
+    for eventType in (CoinCollectedEvent, KeyCollectedEvent, DoorOpeningEvent,
+                      DoorOpenedEvent, CheckpointReachedEvent, PlayerFallingEvent):
+        eventBus.addListener(eventType, rewinder)
     
     # create fixed sprites
     global fixedSprites
@@ -88,7 +151,7 @@ def startGame(cont = False):
     fixedCoin = FixedCoin((27, 3))
     coinCount = CoinCount(registry.coinCount, (38, 3))
     keyCount = KeyCount(registry.keyCount, (0, 3))
-    lives = Lives(2, (3, 3))
+    lives = Lives(INITIAL_LIVES, (3, 3))
     checkpointIcon = CheckpointIcon((-11, -11))
     fixedSprites.add(fixedCoin, lives, coinCount, keyCount, checkpointIcon)
     
@@ -99,16 +162,54 @@ def startGame(cont = False):
     player.keyCount = keyCount
     player.lives = lives
     player.checkpointIcon = checkpointIcon
-    # create the map
-    rpgMap = parser.loadRpgMap(registry.mapName)
-    player.setup("ulmo", rpgMap, eventBus)
-    # set the start position
-    player.setTilePosition(registry.playerPosition[0],
-                           registry.playerPosition[1],
-                           registry.playerLevel)
+    # sprite sounds are heard from the player's view
+    soundHandler.setViewRect(player.viewRect)
 
-    # return the play state
-    return PlayState()
+"""
+Stops the display being updated.  The states still draw to the screen surface
+as normal, so the game plays exactly the same - there's just nothing to see.
+"""
+def setHeadless(on = True):
+    global headless
+    headless = on
+
+"""
+Tells the states whether the next tick is going to be shown.  On a tick that
+isn't shown the play state still moves + animates its sprites but skips
+drawing, which keeps the game running at full speed when the display can't
+keep up.
+"""
+def setRenderFrame(render = True):
+    global renderFrame
+    renderFrame = render
+
+"""
+Starts profiling the play state + showing the overlay, or stops it again and
+prints a summary.
+"""
+def toggleProfiler():
+    global profiler
+    if profiler:
+        print(profiler.getSummary())
+        profiler = None
+    else:
+        profiler = FrameProfiler()
+
+"""
+Called by the states when they have drawn to the screen.  The display is then
+flipped once by the game loop at the end of the tick, if the tick is shown.
+"""
+def updateDisplay():
+    global displayUpdated
+    displayUpdated = True
+
+def flipDisplay():
+    global displayUpdated
+    if displayUpdated and not headless:
+        pygame.display.flip()
+    displayUpdated = False
+    if profiler:
+        profiler.lap(FLIP)
 
 def hidePlayer(boundary, mapRect, modifier = None):
     playerRect = player.mapRect
@@ -134,7 +235,7 @@ def sceneZoomIn(screenImage, ticks):
                                           VIEW_WIDTH - xBorder * 2,
                                           VIEW_HEIGHT - yBorder * 2)
     screen.blit(extract, (xBorder, yBorder))
-    pygame.display.flip()
+    updateDisplay()
 
 def sceneZoomOut(screenImage, ticks):
     xBorder, yBorder = (64 - ticks) * X_MULT, (64 - ticks) * Y_MULT
@@ -142,7 +243,7 @@ def sceneZoomOut(screenImage, ticks):
                                           VIEW_WIDTH - xBorder * 2,
                                           VIEW_HEIGHT - yBorder * 2)
     screen.blit(extract, (xBorder, yBorder))
-    pygame.display.flip()
+    updateDisplay()
   
 class PlayState:
     
@@ -151,13 +252,38 @@ class PlayState:
         player.updateViewRect()
         # add the player to the visible group
         self.visibleSprites = sprites.RpgSprites(player)
-        # create more sprites
-        self.gameSprites = spritebuilder.createSpritesForMap(player.rpgMap, eventBus, registryHandler.registry)
+        # create more sprites - these are loaded as the view approaches them
+        self.spriteLoader = spritebuilder.SpriteLoader(player.rpgMap, eventBus, registryHandler.registry)
+        self.gameSprites = self.spriteLoader.gameSprites
+        # the rewind buffer only covers the current play state
+        rewinder.start(player, self.spriteLoader)
+        # load any sounds for this map that haven't been used yet
+        preloadSounds(getMapSounds(player.rpgMap))
+        # fade over to this map's music, if it differs from the last map
+        musicPlayer.play(player.rpgMap.music)
+        # what was last drawn to the screen - see isViewChanged
+        self.viewSignature = None
              
     def execute(self, keyPresses):
+        if keyPresses[REWIND_KEY]:
+            if profiler:
+                profiler.pause()
+            rewinder.rewind()
+            if renderFrame:
+                self.drawRewindView(screen)
+                updateDisplay()
+            self.viewSignature = None
+            return None
+        if profiler:
+            profiler.beginFrame()
         transition = self.getNextTransition(keyPresses)
         if transition:
+            if profiler:
+                profiler.pause()
             print("transition: %s" % transition.__class__.__name__)
+            if eventBus.tracer:
+                eventBus.tracer.mark(transition.__class__.__name__)
+            self.release()
             if transition.type == BOUNDARY_TRANSITION:
                 return BoundaryTransitionState(transition)
             if transition.type == SCENE_TRANSITION:
@@ -168,22 +294,36 @@ class PlayState:
                 return GameOverState()
             if transition.type == END_GAME_TRANSITION:
                 return EndGameState()
-        # draw the map view to the screen
-        self.drawMapView(screen)
-        pygame.display.flip()
+        # move + animate the sprites, then draw the map view to the screen if
+        # anything in it has changed
+        self.updateSprites()
+        if renderFrame and self.isViewChanged():
+            self.drawView(screen)
+            if profiler:
+                profiler.markDrawn()
+                self.drawProfilerOverlay(screen)
+                profiler.lap(OVERLAY)
+            updateDisplay()
+        rewinder.capture()
         return None
     
     def getNextTransition(self, keyPresses):
         # have we triggered any events?
         transition = self.handleEvents()
+        if profiler:
+            profiler.lap(EVENTS)
         if transition:
             return transition
         # have we collided with any sprites?
         transition = self.handleCollisions()
+        if profiler:
+            profiler.lap(COLLISIONS)
         if transition:
             return transition
         # have we hit any boundaries?
         transition = self.handleInput(keyPresses)
+        if profiler:
+            profiler.lap(INPUT)
         if transition:
             return transition
         return None
@@ -229,14 +369,88 @@ class PlayState:
             action = True
         return directionBits, action
     
-    def drawMapView(self, surface, increment = 1):
-        surface.blit(player.getMapView(), ORIGIN)
+    """
+    Updates the sprites + draws the map view to the given surface.  When render
+    is False the sprites are still moved + animated, just not drawn.
+    """
+    def drawMapView(self, surface, increment = 1, render = True):
+        self.updateSprites(increment)
+        if render:
+            self.drawView(surface, increment)
+
+    def updateSprites(self, increment = 1):
+        self.spriteLoader.update(player.viewRect)
         # if the sprite being updated is in view it will be added to visibleSprites as a side-effect
         self.gameSprites.update(player, self.gameSprites, self.visibleSprites, increment)
+        if profiler:
+            profiler.lap(UPDATE)
+
+    def drawView(self, surface, increment = 1):
+        surface.blit(player.getMapView(), ORIGIN)
+        if profiler:
+            profiler.lap(BACKGROUND)
         self.visibleSprites.draw(surface)
+        if profiler:
+            profiler.lap(DRAW)
         if increment:
             fixedSprites.draw(surface)
+            if profiler:
+                profiler.lap(HUD)
+    
+    """
+    Returns what the view would show - the map, the view position + the frame,
+    position + level of each visible sprite and fixed sprite.  A masked sprite
+    is identified by the shared frame it was copied from, as the copy is new
+    each tick.
+    """
+    def getViewSignature(self):
+        spriteKeys = tuple((sprite.spriteFrames.unmaskedFrame or sprite.image,
+                            sprite.rect.topleft, sprite.level)
+                           for sprite in self.visibleSprites.spritedict)
+        fixedKeys = tuple((sprite.image, sprite.rect.topleft) for sprite in fixedSprites.spritedict)
+        return player.rpgMap, player.viewRect.topleft, profiler, spriteKeys, fixedKeys
+
+    """
+    Returns True if the view needs to be drawn, ie. if it would look any
+    different from when it was last drawn.  The view is always drawn while the
+    profiler overlay is shown.
+    """
+    def isViewChanged(self):
+        viewSignature = self.getViewSignature()
+        if viewSignature == self.viewSignature and not profiler:
+            return False
+        self.viewSignature = viewSignature
+        return True
+
+    def drawProfilerOverlay(self, surface):
+        pool = spritebuilder.spritePool
+        profiler.drawOverlay(surface, gameFont,
+                             (len(self.visibleSprites), len(self.gameSprites)),
+                             [("POOL", (pool.hits, pool.misses)),
+                              ("MAPS", parser.mapCacheCounts),
+                              ("TILES", parser.tileSetCacheCounts)])
+    
+    """
+    Draws the map view without moving or animating the sprites, as their state
+    has been restored by the rewinder.
+    """
+    def drawRewindView(self, surface):
+        surface.blit(player.getMapView(), ORIGIN)
+        self.spriteLoader.update(player.viewRect)
+        for sprite in self.gameSprites.sprites():
+            sprite.updateView(player, self.visibleSprites)
+        self.visibleSprites.draw(surface)
+        fixedSprites.draw(surface)
     
+    """
+    Called when this state is finished with.  Game sprites are released so they
+    can be reused, and the player is removed from the visible group so the
+    group can be garbage collected.
+    """
+    def release(self):
+        spritebuilder.releaseSprites(self.gameSprites)
+        self.visibleSprites.remove(player)
+        
     def lifeLostTransition(self):
         registryHandler.switchToSnapshot()
         registry = registryHandler.registry
@@ -253,7 +467,7 @@ class PlayState:
         player.wrapMovement(player.level,
                             player.spriteFrames.direction,
                             px, py)
-        self.drawMapView(screen, 0)
+        self.drawMapView(screen, 0, renderFrame)
 
 class SceneTransitionState:
     
@@ -266,11 +480,11 @@ class SceneTransitionState:
     def execute(self, keyPresses):
         if self.ticks < 32:
             if self.ticks == 0 and self.transition.type == SCENE_TRANSITION:
-                eventBus.dispatchMapTransitionEvent(MapTransitionEvent())
+                eventBus.dispatch(MapTransitionEvent())
             sceneZoomIn(self.screenImage, self.ticks)
         elif self.ticks == 32:
             # load the next map
-            nextRpgMap = parser.loadRpgMap(self.transition.mapName)
+            nextRpgMap = self.getNextRpgMap()
             player.rpgMap = nextRpgMap
             # set player position
             player.setTilePosition(self.transition.tilePosition[0],
@@ -297,6 +511,15 @@ class SceneTransitionState:
             return ShowPlayerState(direction, self.nextState, DOORWAY_TICKS[direction])
         self.ticks += 1
         return None
+    
+    """
+    Maps are only parsed the first time they are visited.  When a cached map is
+    returned any levels added on the last visit, eg. by an open door, are
+    removed and the play state reapplies the map actions recorded in the
+    registry.  This also covers respawning on the map the player is already on.
+    """
+    def getNextRpgMap(self):
+        return parser.getRpgMap(self.transition.mapName)
 
 class BoundaryTransitionState:
     
@@ -309,10 +532,10 @@ class BoundaryTransitionState:
                      
     def execute(self, keyPresses):
         if self.ticks == 0:
-            eventBus.dispatchMapTransitionEvent(MapTransitionEvent())
+            eventBus.dispatch(MapTransitionEvent())
             self.oldImage = screen.copy()
-            # load another map
-            nextRpgMap = parser.loadRpgMap(self.transition.mapName)
+            # get another map - see SceneTransitionState.getNextRpgMap
+            nextRpgMap = parser.getRpgMap(self.transition.mapName)
             player.rpgMap = nextRpgMap
             player.spriteFrames.direction = self.boundary
             # set the new position
@@ -335,7 +558,7 @@ class BoundaryTransitionState:
             else: # self.boundary == RIGHT
                 screen.blit(self.oldImage.subsurface(xSlice, 0, VIEW_WIDTH - xSlice, VIEW_HEIGHT), ORIGIN)
                 screen.blit(self.nextImage.subsurface(0, 0, xSlice, VIEW_HEIGHT), (VIEW_WIDTH - xSlice, 0))                
-            pygame.display.flip()
+            updateDisplay()
         else:
             return ShowPlayerState(self.boundary, self.nextState, BOUNDARY_TICKS[self.boundary])
             # return self.nextState
@@ -373,13 +596,13 @@ class GameOverState:
                 screen.blit(self.topLine3, (x, y))
                 # set the countdown topleft for later
                 self.countdownTopleft = (x, y)
-            pygame.display.flip()
+            updateDisplay()
         elif self.ticks == 64:
             x, y = (VIEW_WIDTH - self.lowLine1.get_width()) // 2, VIEW_HEIGHT - 42 * view.SCALAR
             screen.blit(self.lowLine1, (x, y))
             x, y = (VIEW_WIDTH - self.lowLine2.get_width()) // 2, VIEW_HEIGHT - 30 * view.SCALAR
             screen.blit(self.lowLine2, (x, y))
-            pygame.display.flip()
+            updateDisplay()
             if self.continueOffered:
                 self.countdown = 10
         elif self.ticks > 64:
@@ -388,6 +611,10 @@ class GameOverState:
                     return startGame(True)
                 return startGame()
         self.ticks += 1
+    
+    # method used by the game loop to decide whether to wait for a key press
+    def isWaitingForInput(self):
+        return self.ticks > 65 and not self.countdown
         
     def updateCountdown(self):
         self.countdown = self.countdown - 1
@@ -397,7 +624,7 @@ class GameOverState:
             screen.blit(countdownLine, self.countdownTopleft)
         else:
             self.countdown = None
-        pygame.display.flip()
+        updateDisplay()
 
 class EndGameState:
     
@@ -413,7 +640,7 @@ class EndGameState:
     def execute(self, keyPresses):
         if self.ticks < 32:
             if self.ticks == 0:
-                eventBus.dispatchEndGameEvent(EndGameEvent())
+                eventBus.dispatch(EndGameEvent())
             sceneZoomIn(self.screenImage, self.ticks)
         elif self.ticks == 32:
             x, y = (VIEW_WIDTH - self.topLine1.get_width()) // 2, 32 * view.SCALAR
@@ -422,17 +649,21 @@ class EndGameState:
             screen.blit(self.topLine2, (x, y))
             x, y = (VIEW_WIDTH - self.topLine3.get_width()) // 2, 56 * view.SCALAR
             screen.blit(self.topLine3, (x, y))
-            pygame.display.flip()
+            updateDisplay()
         elif self.ticks == 64:
             x, y = (VIEW_WIDTH - self.lowLine1.get_width()) // 2, VIEW_HEIGHT - 42 * view.SCALAR
             screen.blit(self.lowLine1, (x, y))
             x, y = (VIEW_WIDTH - self.lowLine2.get_width()) // 2, VIEW_HEIGHT - 30 * view.SCALAR
             screen.blit(self.lowLine2, (x, y))
-            pygame.display.flip()
+            updateDisplay()
         elif self.ticks > 64:
             if keyPresses[K_SPACE]:
                 return startGame()
         self.ticks += 1
+    
+    # method used by the game loop to decide whether to wait for a key press
+    def isWaitingForInput(self):
+        return self.ticks > 65
         
 class ShowPlayerState:
     
@@ -455,6 +686,6 @@ class ShowPlayerState:
         else: # self.boundary == RIGHT
             px = MOVE_UNIT
         self.nextState.showPlayer(px, py)
-        pygame.display.flip()
+        updateDisplay()
         self.ticks += 1
         return None
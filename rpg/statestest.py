@@ -0,0 +1,255 @@
+#! /usr/bin/env python
+
+import os
+import gc
+import collections
+import unittest
+import tracemalloc
+import pygame
+
+from pygame.locals import K_LEFT, K_RIGHT, K_DOWN
+from . import parser
+from .registry import Registry
+from .replay import decodeReplay
+
+# run without a display or sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# game assets are loaded relative to the top level folder
+GAME_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# no keys pressed
+NO_KEYS = collections.defaultdict(bool)
+
+states = None
+gameloop = None
+
+def setUpModule():
+    global states, gameloop, testFolder, parserFolders
+    testFolder = os.getcwd()
+    os.chdir(GAME_FOLDER)
+    # other tests may have pointed the parser at a different folder
+    parserFolders = parser.MAPS_FOLDER, parser.TILES_FOLDER
+    parser.MAPS_FOLDER, parser.TILES_FOLDER = "maps", "tiles"
+    pygame.mixer.pre_init(44100, -16, 2, 1024)
+    pygame.init()
+    from . import states, gameloop
+
+def tearDownModule():
+    parser.MAPS_FOLDER, parser.TILES_FOLDER = parserFolders
+    os.chdir(testFolder)
+
+class WarmRestartTest(unittest.TestCase):
+
+    def testRestartReusesGameObjects(self):
+        states.startGame()
+        eventBus, player, rpgMap = states.eventBus, states.player, states.player.rpgMap
+        playState = states.startGame()
+        self.assertIs(eventBus, states.eventBus)
+        self.assertIs(player, states.player)
+        self.assertIs(rpgMap, states.player.rpgMap)
+        self.assertIsInstance(playState, states.PlayState)
+
+    def testRestartResetsGameState(self):
+        states.startGame()
+        player = states.player
+        player.incrementCoinCount()
+        player.incrementKeyCount()
+        player.loseLife()
+        player.setTilePosition(10, 10, 1)
+        states.startGame()
+        registry = states.registryHandler.registry
+        self.assertEqual(0, player.getCoinCount())
+        self.assertEqual(0, player.getKeyCount())
+        self.assertEqual(states.INITIAL_LIVES, player.lives.count)
+        self.assertEqual(registry.playerPosition, player.tilePosition)
+        self.assertEqual(registry.playerLevel, player.level)
+
+    def testRepeatedRestartsDoNotLeak(self):
+        # warm up so that any assets + caches are populated
+        for i in range(5):
+            states.startGame()
+        gc.collect()
+        objectCount = len(gc.get_objects())
+        tracemalloc.start()
+        for i in range(200):
+            states.startGame()
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertLess(current, 64 * 1024)
+        self.assertLess(len(gc.get_objects()) - objectCount, 100)
+
+class LifeLostTest(unittest.TestCase):
+
+    def respawn(self, playState):
+        transition = playState.lifeLostTransition()
+        state = states.SceneTransitionState(transition)
+        for i in range(33):
+            state.execute(NO_KEYS)
+        return state.nextState
+
+    def testRespawnReusesCurrentMap(self):
+        playState = states.startGame()
+        rpgMap = states.player.rpgMap
+        self.respawn(playState)
+        self.assertIs(rpgMap, states.player.rpgMap)
+
+    def testRespawnResetsMapActions(self):
+        playState = states.startGame()
+        rpgMap = states.player.rpgMap
+        # eg. a door opened since the last checkpoint
+        rpgMap.addLevel(0, 0, 9)
+        self.respawn(playState)
+        self.assertNotIn(9, rpgMap.mapTiles[0][0].levels)
+        self.assertEqual([], rpgMap.addedLevels)
+
+class RewindTest(unittest.TestCase):
+    
+    def play(self, playState, key, ticks):
+        keyPresses = collections.defaultdict(bool, {key: True})
+        for i in range(ticks):
+            playState.execute(keyPresses)
+    
+    def testRewindRestoresPlayer(self):
+        playState = states.startGame()
+        self.play(playState, K_RIGHT, 1)
+        position = states.player.mapRect.topleft
+        self.play(playState, K_RIGHT, 20)
+        self.assertNotEqual(position, states.player.mapRect.topleft)
+        self.play(playState, states.REWIND_KEY, 20)
+        self.assertEqual(position, states.player.mapRect.topleft)
+        # nothing left to rewind
+        self.play(playState, states.REWIND_KEY, 1)
+        self.assertEqual(position, states.player.mapRect.topleft)
+        
+    def testRewindRestoresCoin(self):
+        states.startGame()
+        states.registryHandler.setRegistry(Registry("central", (3, 20), 2))
+        playState = states.startGame(True)
+        self.play(playState, K_LEFT, 10)
+        self.assertEqual(1, states.player.getCoinCount())
+        self.play(playState, states.REWIND_KEY, 10)
+        self.assertEqual(0, states.player.getCoinCount())
+        self.assertIsNone(states.registryHandler.getMetadata("central:coin:0"))
+        self.assertIn("central:coin:0", [sprite.uid for sprite in playState.gameSprites])
+
+class HeadlessTest(unittest.TestCase):
+
+    def tearDown(self):
+        states.setHeadless(False)
+
+    def testScriptedInputRunsTransitions(self):
+        states.startGame()
+        states.registryHandler.setRegistry(Registry("caves", (11, 15), 1))
+        gameLoop = gameloop.GameLoop()
+        gameLoop.start(True)
+        # walk down out of the caves
+        scriptedInput = gameloop.ScriptedInput([(600, [K_DOWN])])
+        gameloop.runHeadless(gameLoop, scriptedInput, 600)
+        self.assertTrue(scriptedInput.isFinished())
+        self.assertEqual(600, gameLoop.frameCount)
+        self.assertIn("SceneTransitionState", gameLoop.stateCounts)
+        self.assertIsInstance(gameLoop.currentState, states.PlayState)
+        self.assertEqual("central", states.player.rpgMap.name)
+        # the map was cached by the first game, not parsed again
+        self.assertIs(parser.rpgMaps["central"], states.player.rpgMap)
+
+class FixedTimestepTest(unittest.TestCase):
+
+    def tearDown(self):
+        states.setRenderFrame()
+
+    def testTicksKeepUpWithTime(self):
+        timestep = gameloop.FixedTimestep(60, 5)
+        self.assertEqual(1, timestep.advance(0.0))
+        self.assertEqual(0, timestep.advance(0.01))
+        self.assertEqual(1, timestep.advance(0.02))
+        # a slow frame
+        self.assertEqual(3, timestep.advance(0.07))
+        self.assertEqual(2, timestep.skippedCount)
+        self.assertEqual(0, timestep.droppedTime)
+
+    def testFrameSkipIsCapped(self):
+        timestep = gameloop.FixedTimestep(60, 5)
+        timestep.advance(0.0)
+        self.assertEqual(6, timestep.advance(1.0))
+        self.assertAlmostEqual(54 / 60, timestep.droppedTime)
+        self.assertEqual(0, timestep.advance(1.01))
+
+    def testSkippedFramesPlayTheSame(self):
+        positions = []
+        for frameSkip in (0, 4):
+            states.startGame()
+            states.registryHandler.setRegistry(Registry("caves", (11, 15), 1))
+            gameLoop = gameloop.GameLoop()
+            gameLoop.start(True)
+            scriptedInput = gameloop.ScriptedInput([(200, [K_DOWN]), (100, [K_LEFT])])
+            for i in range(300):
+                gameLoop.step(scriptedInput.getKeyPresses(), i % (frameSkip + 1) == 0)
+            positions.append((states.player.rpgMap.name, states.player.mapRect.topleft,
+                              gameLoop.stateCounts))
+        self.assertEqual(positions[0], positions[1])
+
+    def testProfilerCountsDrawnFrames(self):
+        states.startGame()
+        gameLoop = gameloop.GameLoop()
+        gameLoop.start(registry = Registry("caves", (11, 15), 1))
+        states.toggleProfiler()
+        profiler = states.profiler
+        try:
+            # two ticks are skipped for every one that is drawn
+            for i in range(90):
+                gameLoop.step(NO_KEYS, i % 3 == 2)
+            self.assertAlmostEqual(1 / 3, profiler.getFramesPerSecond() / profiler.getTicksPerSecond(), delta = 0.02)
+        finally:
+            states.toggleProfiler()
+
+class IdleViewTest(unittest.TestCase):
+
+    def testStaticViewIsNotRedrawn(self):
+        states.startGame()
+        gameLoop = gameloop.GameLoop()
+        # nothing moves or animates in view of this spot
+        gameLoop.start(registry = Registry("central", (22, 13), 3))
+        playState = gameLoop.currentState
+        # the execute calls are made directly to see what they draw before the
+        # display is flipped
+        states.displayUpdated = False
+        playState.execute(NO_KEYS)
+        self.assertTrue(states.displayUpdated)
+        for i in range(10):
+            states.displayUpdated = False
+            playState.execute(NO_KEYS)
+            self.assertFalse(states.displayUpdated)
+        states.player.setDirection(states.LEFT)
+        playState.execute(NO_KEYS)
+        self.assertTrue(states.displayUpdated)
+        states.flipDisplay()
+
+class ReplayTest(unittest.TestCase):
+
+    def tearDown(self):
+        states.setHeadless(False)
+
+    def testReplayMatchesRecording(self):
+        states.startGame()
+        gameLoop = gameloop.GameLoop()
+        gameLoop.start(registry = Registry("caves", (11, 15), 1))
+        gameLoop.startRecording()
+        gameloop.runHeadless(gameLoop, gameloop.ScriptedInput(gameloop.getRandomScript(1, 3000)), 3000)
+        recording = gameLoop.recorder.encode(states.player, states.registryHandler.registry)
+        self.assertLess(len(recording), 1024)
+        # play the recording from somewhere else entirely
+        states.startGame()
+        replay = decodeReplay(recording)
+        self.assertEqual(3000, replay.frameCount)
+        gameLoop = gameloop.GameLoop()
+        gameLoop.start(registry = replay.registry)
+        self.assertFalse(replay.verify(states.player, states.registryHandler.registry))
+        gameloop.runHeadless(gameLoop, gameloop.ScriptedInput(replay.getScript()), replay.frameCount)
+        self.assertTrue(replay.verify(states.player, states.registryHandler.registry))
+
+if __name__ == "__main__":
+    unittest.main()
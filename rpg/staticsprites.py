@@ -2,74 +2,78 @@
 
 from .sprites import *
 
-from .spriteframes import StaticFrames
+from .spriteframes import StaticFrames, AnimationClock
 from .events import CoinCollectedEvent, KeyCollectedEvent, DoorOpenedEvent, DoorOpeningEvent, CheckpointReachedEvent
 from .events import KeyMetadata, CoinMetadata, DoorMetadata, CheckpointMetadata
 
 class Flames(OtherSprite):
     
     framesImage = None
+    animationFrames = None
     
     def __init__(self):
         if Flames.framesImage is None:    
             imagePath = os.path.join(SPRITES_FOLDER, "flame-frames.png")
-            Flames.framesImage = view.loadScaledImage(imagePath, None)        
-        animationFrames = view.processStaticFrames(Flames.framesImage)
-        spriteFrames = StaticFrames(animationFrames, 6)
+            Flames.framesImage = view.loadScaledImage(imagePath, None)
+            Flames.animationFrames = view.copyStaticFrames(view.processStaticFrames(Flames.framesImage))
+        spriteFrames = StaticFrames(Flames.animationFrames, 6)
         OtherSprite.__init__(self, spriteFrames, (4, 2))
 
 class Coin(OtherSprite):
     
     framesImage = None
+    animationFrames = None
     
     baseRectSize = (8 * SCALAR, BASE_RECT_HEIGHT)
         
     def __init__(self):
         if Coin.framesImage is None:    
             imagePath = os.path.join(SPRITES_FOLDER, "coin-frames.png")
-            Coin.framesImage = view.loadScaledImage(imagePath, None)        
-        animationFrames = view.processStaticFrames(Coin.framesImage)
-        spriteFrames = StaticFrames(animationFrames, 6)
+            Coin.framesImage = view.loadScaledImage(imagePath, None)
+            Coin.animationFrames = view.copyStaticFrames(view.processStaticFrames(Coin.framesImage))
+        spriteFrames = StaticFrames(Coin.animationFrames, 6)
         OtherSprite.__init__(self, spriteFrames, (2, 2))
         
     def processCollision(self, player):
         event = CoinCollectedEvent(CoinMetadata(self.uid))
-        self.eventBus.dispatchCoinCollectedEvent(event)
+        self.eventBus.dispatch(event)
         player.incrementCoinCount()
         self.toRemove = True
 
 class Key(OtherSprite):
     
     framesImage = None
+    animationFrames = None
     
     baseRectSize = (8 * SCALAR, BASE_RECT_HEIGHT)
         
     def __init__(self):
         if Key.framesImage is None:    
             imagePath = os.path.join(SPRITES_FOLDER, "key-frames.png")
-            Key.framesImage = view.loadScaledImage(imagePath, None)        
-        animationFrames = view.processStaticFrames(Key.framesImage, 6)
-        spriteFrames = StaticFrames(animationFrames, 6)
+            Key.framesImage = view.loadScaledImage(imagePath, None)
+            Key.animationFrames = view.copyStaticFrames(view.processStaticFrames(Key.framesImage, 6))
+        spriteFrames = StaticFrames(Key.animationFrames, 6)
         OtherSprite.__init__(self, spriteFrames, (2, 2))
         
     def processCollision(self, player):
         event = KeyCollectedEvent(KeyMetadata(self.uid))
-        self.eventBus.dispatchKeyCollectedEvent(event)
+        self.eventBus.dispatch(event)
         player.incrementKeyCount()
         self.toRemove = True
 
 class Chest(OtherSprite):
     
     framesImage = None
+    animationFrames = None
     
     baseRectSize = (8 * SCALAR, BASE_RECT_HEIGHT)
         
     def __init__(self):
         if Chest.framesImage is None:    
             imagePath = os.path.join(SPRITES_FOLDER, "chest.png")
-            Chest.framesImage = view.loadScaledImage(imagePath, None)        
-        animationFrames = view.processStaticFrames(Chest.framesImage, 1)
-        spriteFrames = StaticFrames(animationFrames)
+            Chest.framesImage = view.loadScaledImage(imagePath, None)
+            Chest.animationFrames = view.copyStaticFrames(view.processStaticFrames(Chest.framesImage, 1))
+        spriteFrames = StaticFrames(Chest.animationFrames)
         OtherSprite.__init__(self, spriteFrames)
         
     # override
@@ -79,15 +83,16 @@ class Chest(OtherSprite):
 class Rock(OtherSprite):
     
     framesImage = None
+    animationFrames = None
     
     baseRectSize = (8 * SCALAR, BASE_RECT_HEIGHT)
         
     def __init__(self):
         if Rock.framesImage is None:    
             imagePath = os.path.join(SPRITES_FOLDER, "rock.png")
-            Rock.framesImage = view.loadScaledImage(imagePath, None)        
-        animationFrames = view.processStaticFrames(Rock.framesImage, 1)
-        spriteFrames = StaticFrames(animationFrames)
+            Rock.framesImage = view.loadScaledImage(imagePath, None)
+            Rock.animationFrames = view.copyStaticFrames(view.processStaticFrames(Rock.framesImage, 1))
+        spriteFrames = StaticFrames(Rock.animationFrames)
         OtherSprite.__init__(self, spriteFrames, (0, -4))
         
     # override
@@ -97,6 +102,7 @@ class Rock(OtherSprite):
 class Door(OtherSprite):
     
     framesImage = None
+    animationFrames = None
     
     baseRectSize = (4 * SCALAR, BASE_RECT_HEIGHT)    
 
@@ -104,12 +110,17 @@ class Door(OtherSprite):
         if Door.framesImage is None:    
             imagePath = os.path.join(SPRITES_FOLDER, "door-frames.png")
             Door.framesImage = view.loadScaledImage(imagePath, None)
-        animationFrames = view.processStaticFrames(Door.framesImage, 8)
-        spriteFrames = StaticFrames(animationFrames, 6)
+            Door.animationFrames = view.copyStaticFrames(view.processStaticFrames(Door.framesImage, 8))
+        spriteFrames = StaticFrames(Door.animationFrames, 6)
         OtherSprite.__init__(self, spriteFrames)
         self.opening = False
-        self.frameCount = 0
-        self.frameIndex = 0
+        # the door opens once rather than looping
+        self.openingClock = AnimationClock(spriteFrames.frameSkip, spriteFrames.numFrames, False)
+
+    def reset(self):
+        OtherSprite.reset(self)
+        self.opening = False
+        self.openingClock.reset()
 
     """
     Base rect extends beyond the bottom of the sprite image so player's base
@@ -120,40 +131,41 @@ class Door(OtherSprite):
         
     # override
     def advanceFrame(self, increment, metadata):
-        if increment and self.opening:
-            self.frameCount = (self.frameCount + increment) % self.spriteFrames.frameSkip
-            if self.frameCount == 0:
-                self.frameIndex += 1       
-                if self.frameIndex == self.spriteFrames.numFrames:
-                    self.opened()
-                else:
-                    self.image = self.spriteFrames.animationFrames[self.frameIndex]
+        if self.opening and self.openingClock.advance(increment) is not None:
+            if self.openingClock.isFinished():
+                self.opened()
+            else:
+                self.image = self.spriteFrames.animationFrames[self.openingClock.frameIndex]
     
     def opened(self):
         metadata = DoorMetadata(self.uid, self.tilePosition, self.level)
         metadata.applyMapActions(self.rpgMap)
         event = DoorOpenedEvent(metadata)
-        self.eventBus.dispatchDoorOpenedEvent(event)
+        self.eventBus.dispatch(event)
         self.toRemove = True
         
+    def isStatic(self):
+        return not self.opening
+        
     def processAction(self, player):
         if player.getKeyCount() > 0 and not self.opening:
             player.decrementKeyCount()
             self.opening = True
-            self.eventBus.dispatchDoorOpeningEvent(DoorOpeningEvent())
+            self.eventBus.dispatch(DoorOpeningEvent())
 
 class Checkpoint(OtherSprite):
     
     framesImage = None
+    animationFrames = None
     
     baseRectSize = (8 * SCALAR, BASE_RECT_HEIGHT)
         
     def __init__(self):
         if Checkpoint.framesImage is None:    
             imagePath = os.path.join(SPRITES_FOLDER, "check-frames.png")
-            Checkpoint.framesImage = view.loadScaledImage(imagePath, None)        
-        animationFrames = view.processStaticFrames(Checkpoint.framesImage, 4)
-        spriteFrames = StaticFrames(animationFrames, 12)
+            Checkpoint.framesImage = view.loadScaledImage(imagePath, None)
+            Checkpoint.animationFrames = view.copyStaticFrames(view.processStaticFrames(Checkpoint.framesImage, 4))
+        spriteFrames = StaticFrames(Checkpoint.animationFrames, 12)
         OtherSprite.__init__(self, spriteFrames, (3, -3))
         
     def processCollision(self, player):
@@ -163,20 +175,21 @@ class Checkpoint(OtherSprite):
                                                           self.level,
                                                           player.getCoinCount(),
                                                           player.getKeyCount()))
-        self.eventBus.dispatchCheckpointReachedEvent(event)
+        self.eventBus.dispatch(event)
         player.checkpointReached()
         self.toRemove = True
         
 class Shadow(OtherSprite):
     
     framesImage = None
+    animationFrames = None
     
     def __init__(self):
         if Shadow.framesImage is None:    
             imagePath = os.path.join(SPRITES_FOLDER, "shadow.png")
-            Shadow.framesImage = view.loadScaledImage(imagePath, None)        
-        animationFrames = view.processStaticFrames(Shadow.framesImage, 1)
-        spriteFrames = StaticFrames(animationFrames)
+            Shadow.framesImage = view.loadScaledImage(imagePath, None)
+            Shadow.animationFrames = view.copyStaticFrames(view.processStaticFrames(Shadow.framesImage, 1))
+        spriteFrames = StaticFrames(Shadow.animationFrames)
         OtherSprite.__init__(self, spriteFrames, (4, 2))
         self.upright = False
         
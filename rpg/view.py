@@ -14,6 +14,9 @@ TILE_SIZE = 16 * SCALAR
 VIEW_WIDTH = TILE_SIZE * 16
 VIEW_HEIGHT = TILE_SIZE * 10
 
+# game ticks per second - everything that moves or animates is timed in ticks
+FRAMES_PER_SEC = 60
+
 # 0, 51, 102, 153, 204, 255
 TRANSPARENT_COLOUR = GREEN
 TRANSPARENT_COLOUR_WITH_ALPHA = (0, 255, 0, 255)